@@ -1,9 +1,6 @@
 
 from flask import Flask, jsonify, render_template, redirect, request, url_for, make_response, session, g, abort, send_from_directory
 
-import torch
-torch.set_grad_enabled(False)
-
 import pyodbc
 # Disable pyodb pooling, to let sqlalchemy use it's own pooling.
 # Reference: https://docs.sqlalchemy.org/en/20/dialects/mssql.html#pyodbc-pooling-connection-close-behavior
@@ -33,6 +30,10 @@ migrate = Migrate(app, db)
 
 import db_logging
 
+# Runs first, so later hooks can skip work for crawlers.
+import bots
+app.before_request(bots.detect_bot)
+
 # Register cookie handlers.
 import cookie_handler
 app.before_request(cookie_handler.get_auth_info)
@@ -41,14 +42,59 @@ app.after_request(cookie_handler.update_cookies)
 
 # Define after db, because it uses db.session for writes.
 import core ## Loads all artifacts as well. 
+from artifact_registry import ArtifactNotReady
+import artifacts_loader
 
 oauth = OAuth(app)
 google_oauth = google_auth_handler.get_google_oauth(oauth)
 
+def raw_json_response(**fields):
+    """Builds a JSON object response from already serialized values (bytes), skipping jsonify's re-encoding."""
+    body = b'{' + b','.join(json.dumps(key).encode() + b':' + value for key, value in fields.items()) + b'}'
+    return app.response_class(body, mimetype=app.json.mimetype)
+
+def use_product_json():
+    """Whether the current endpoint opted in to pre-serialized product json via Config.PRODUCT_JSON_ROUTES."""
+    return request.endpoint in Config.PRODUCT_JSON_ROUTES
+
 @app.context_processor
 def inject_deployment_type():
     return dict(deployment_type=app.config['DEPLOYMENT_TYPE'])
 
+# Routes reading artifacts and catching Exception re-raise ArtifactNotReady first, so it reaches this handler.
+@app.errorhandler(ArtifactNotReady)
+def artifact_not_ready(e):
+    print(f"ERROR: {request.path} : {e}")
+    if request.path.startswith('/api/'):
+        return jsonify({'error' : 'NOT_READY'}), 503, {'Retry-After' : '5'}
+    return 'Loading, please retry in a few seconds.', 503, {'Retry-After' : '5'}
+
+# ============================= #
+# Health                        #
+# ============================= #
+# Liveness : the worker is up, even if artifacts are still loading.
+@app.route('/healthz')
+def healthz():
+    return 'ok', 200
+
+def loaded_artifact_stats(name, get_stats):
+    """get_stats(artifact) if the artifact is loaded, without waiting for it. None otherwise."""
+    try:
+        return get_stats(core.artifacts.get(name, timeout=0))
+    except ArtifactNotReady:
+        return None
+
+# Readiness : all artifacts are loaded.
+@app.route('/readyz')
+def readyz():
+    status = {'ready' : core.artifacts.is_ready(), 'artifacts' : core.artifacts.status(), 'load_timings' : dict(artifacts_loader.load_timings),
+              'user_click_writer' : db_logging.user_click_writer.stats(), 'bot_detector' : bots.bot_detector.stats(),
+              'verified_cookies' : cookie_handler.verified_cookies.stats() if cookie_handler.verified_cookies else None,
+              'search_batcher' : core.search_batcher.stats(),
+              'query_embedding_cache' : loaded_artifact_stats('query_encoder', lambda query_encoder: query_encoder.cache.stats()),
+              'search_results_cache' : core.search_results_cache.stats()}
+    return jsonify(status), (200 if status['ready'] else 503)
+
 # ============================= #
 # Static Routes                 #
 # ============================= #
@@ -107,6 +153,8 @@ def api_feed():
         print("Error getting num_products in /api/feed: ", e)
         num_products = Config.FEED_NUM_PRODUCTS
     
+    if use_product_json():
+        return raw_json_response(products=core.get_feed(user_id=g.user_id, num_products=num_products, as_json=True))
     return jsonify({'products' : core.get_feed(user_id=g.user_id, num_products=num_products)})
 
 # ============================= #
@@ -121,8 +169,8 @@ def web_inspirations(gender):
 @app.route('/api/inspiration', defaults={'gender': None}, methods = ['GET', 'POST'])
 @app.route('/api/inspiration/<path:gender>', methods=['GET', 'POST'])
 def api_inspirations(gender):
-    inspirations, gender = core.get_inspirations(gender=gender)
-    return jsonify({'inspirations' : inspirations})
+    inspirations, gender = core.get_inspirations(gender=gender, as_json=True)
+    return raw_json_response(inspirations=inspirations)
 
 # ============================= #
 # Search                        #
@@ -133,14 +181,18 @@ def web_query(query):
     # Frontend slugifies the urls by converting spaces to ' '. 
     query = query.replace('-', ' ')
     db_logging.log_search(query, request.referrer)
-    return render_template('query.html', products=core.get_search_results(query), query=query)
+    return render_template('query.html', products=core.get_search_results(query, user_id=g.user_id), query=query)
 
 @app.route('/api/query', methods=['GET', 'POST'])
 def api_query():
     try:
         query = request.json.get('query')
         db_logging.log_search(query, request.json.get('referrer'))
-        return jsonify({'products' : core.get_search_results(query), 'query': query})
+        if use_product_json():
+            return raw_json_response(products=core.get_search_results(query, as_json=True, user_id=g.user_id), query=json.dumps(query).encode())
+        return jsonify({'products' : core.get_search_results(query, user_id=g.user_id), 'query': query})
+    except ArtifactNotReady:
+        raise
     except Exception as e:
         print(f"ERROR: /api/query/{query}: ", e)
         return jsonify({'error' : 'ERROR'}), 500
@@ -156,16 +208,23 @@ def web_product(slug, product_id):
         return redirect('/')
         
     # TODO: Use is_wishlisted as part of the product itself. 
-    return render_template('product.html', current_product=product, products=core.get_similar_products(product_id), is_wishlisted=product['is_wishlisted'])
+    return render_template('product.html', current_product=product, products=core.get_similar_products(product_id, user_id=g.user_id), is_wishlisted=product['is_wishlisted'])
 
 @app.route('/api/product/<int:product_id>', methods=['GET', 'POST'])
 def api_product(product_id):
     db_logging.log_product_click(product_id=product_id, referrer=request.json.get('referrer'))
     try:
+        if use_product_json():
+            return raw_json_response(
+                product=core.get_product(product_id=product_id, user_id=g.user_id, as_json=True) or b'null',
+                similar_products=core.get_similar_products(product_id, as_json=True, user_id=g.user_id),
+            )
         return jsonify({
             'product' : core.get_product(product_id=product_id, user_id=g.user_id),
-            'similar_products' : core.get_similar_products(product_id),
+            'similar_products' : core.get_similar_products(product_id, user_id=g.user_id),
             })
+    except ArtifactNotReady:
+        raise
     except Exception as e:
         print(f"ERROR: /product/{product_id} failed:", e)
         return jsonify({"error": 'ERROR'}), 400
@@ -189,9 +248,27 @@ def wishlist():
 def api_wishlist():
     if not g.user_id:
         return '', 401
-    wishlisted_products, err = core.get_wishlisted_products(g.user_id)
+    # Paginated with ?cursor=<next_cursor of the previous page>&limit=<page size>.
+    if 'cursor' in request.args or 'limit' in request.args:
+        try:
+            limit = int(request.args.get('limit', Config.WISHLIST_PAGE_SIZE))
+            if not 0 < limit <= Config.WISHLIST_MAX_PAGE_SIZE:
+                raise ValueError(f"{limit=} out of range")
+            wishlisted_products, next_cursor, err = core.get_wishlisted_products_page(
+                g.user_id, cursor=request.args.get('cursor'), limit=limit, as_json=use_product_json())
+        except ValueError as e:
+            return jsonify({'error' : str(e)}), 400
+        if err:
+            abort(500)
+        if use_product_json():
+            return raw_json_response(products=wishlisted_products, next_cursor=json.dumps(next_cursor).encode())
+        return jsonify({'products' : wishlisted_products, 'next_cursor' : next_cursor})
+    
+    wishlisted_products, err = core.get_wishlisted_products(g.user_id, as_json=use_product_json())
     if err:
         abort(500)
+    if use_product_json():
+        return raw_json_response(products=wishlisted_products)
     return jsonify({'products' : wishlisted_products})
 
 # ============================= #
@@ -339,14 +416,7 @@ def api_delete_account():
     if not g.user_id:
         return '', 401
     
-    try:
-        user = core.get_full_user()
-        user.onboarding_stage = None
-        user.gender = None
-        user.birth_year = None
-        db.session.commit()
-    except Exception as e:
-        print("ERROR: Error deleting user: ", e)
+    core.delete_account(g.user_id)
     print(f"USER {g.user_id=} requested to delete their account.")
     return ''
 
@@ -0,0 +1,86 @@
+import threading
+import time
+
+PENDING, LOADING, READY, FAILED = 'PENDING', 'LOADING', 'READY', 'FAILED'
+
+
+class ArtifactNotReady(Exception):
+    """Raised when a request needs an artifact that is still loading (or failed to load)."""
+
+
+class Artifact:
+    def __init__(self, name, loader, deps):
+        self.name, self.loader, self.deps = name, loader, deps
+        self.state, self.value, self.error = PENDING, None, None
+        self.started_at, self.finished_at = None, None
+        self.loaded = threading.Event()
+
+    def status(self):
+        status = {'state' : self.state}
+        if self.started_at:
+            status['seconds'] = round((self.finished_at or time.time()) - self.started_at, 3)
+        if self.error:
+            status['error'] = repr(self.error)
+        return status
+
+
+class ArtifactRegistry:
+    """Loads named artifacts, either synchronously or each in its own background thread.
+
+    A loader receives the values of its deps as positional arguments, and only starts once they're loaded.
+    Requests read artifacts with get(), which waits up to a timeout and raises ArtifactNotReady after.
+    """
+    def __init__(self, wait_timeout=None):
+        self.wait_timeout = wait_timeout
+        self.artifacts = {}
+
+    def register(self, name, loader, deps=()):
+        for dep in deps:
+            assert dep in self.artifacts, f"{name=} depends on unregistered {dep=}"
+        self.artifacts[name] = Artifact(name, loader, tuple(deps))
+
+    def load_all(self, background=False):
+        if not background:
+            for artifact in self.artifacts.values():
+                self._load(artifact)
+            return
+        for artifact in self.artifacts.values():
+            threading.Thread(target=self._load, args=(artifact,), name=f'load-{artifact.name}', daemon=True).start()
+
+    def get(self, name, timeout=-1):
+        """Returns the artifact, waiting up to timeout seconds (default: wait_timeout, None waits forever)."""
+        artifact = self.artifacts[name]
+        timeout = self.wait_timeout if timeout == -1 else timeout
+        if not artifact.loaded.wait(timeout):
+            raise ArtifactNotReady(f"{name} is {artifact.state}")
+        if artifact.state == FAILED:
+            raise ArtifactNotReady(f"{name} failed to load: {artifact.error!r}")
+        return artifact.value
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def set(self, name, value):
+        """Replaces a loaded artifact, e.g. after reloading it."""
+        artifact = self.artifacts[name]
+        artifact.value, artifact.state, artifact.error = value, READY, None
+        artifact.loaded.set()
+
+    def is_ready(self):
+        return all(artifact.state == READY for artifact in self.artifacts.values())
+
+    def status(self):
+        return {name : artifact.status() for name, artifact in self.artifacts.items()}
+
+    def _load(self, artifact):
+        try:
+            deps = [self.get(dep, timeout=None) for dep in artifact.deps]
+            artifact.state, artifact.started_at = LOADING, time.time()
+            artifact.value = artifact.loader(*deps)
+            artifact.state = READY
+        except Exception as e:
+            artifact.state, artifact.error = FAILED, e
+            print(f"CRITICAL: Loading artifact {artifact.name} failed, {e=}")
+        finally:
+            artifact.finished_at = time.time()
+            artifact.loaded.set()
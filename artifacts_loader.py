@@ -1,13 +1,17 @@
 import os
 from config import Config
-import open_clip
 import pandas as pd
-import torch
-import torch.nn.functional as F
-import faiss
 from config import Config
 import json
+import numpy as np
 import time
+from caches import StatsCache
+from query_encoder import QueryEncoder
+from clip_tokenizer import ClipTokenizer
+import search_index
+import text_encoders
+from catalog import Catalog
+from inspirations import Inspirations
 
 
 def append_dashes_to_log(log, max_len=75, dash="="):
@@ -15,6 +19,9 @@ def append_dashes_to_log(log, max_len=75, dash="="):
     dash_count = max((max_len - len(log)), 0)
     return log + dash * dash_count
     
+# func name -> seconds taken by its last call. Served by /readyz.
+load_timings = {}
+
 def log_funcall(func):
     def wrapper(*args, **kwargs):
         start_time = time.time()
@@ -23,41 +30,106 @@ def log_funcall(func):
         result = func(*args, **kwargs)
         
         end_time = time.time()
-        print(append_dashes_to_log(f"Exit {func.__name__} : {int(end_time - start_time)}s"))
+        load_timings[func.__name__] = round(end_time - start_time, 3)
+        print(append_dashes_to_log(f"Exit {func.__name__} : {end_time - start_time:.1f}s"))
         return result
     return wrapper
 
-@log_funcall
-def load_model_and_tokenizer():
+def load_open_clip_text_model(compile=True):
+    # open_clip (and torch) are only imported by workers serving TEXT_ENCODER_RUNTIME=OPEN_CLIP.
+    import open_clip
+    import torch
     model, _, _ = open_clip.create_model_and_transforms('ViT-B-32', pretrained='laion2b_s34b_b79k')
     model.visual = None
-    model = torch.compile(model)
-    tokenizer = open_clip.get_tokenizer('ViT-B-32')
-    return model, tokenizer
+    return torch.compile(model) if compile else model.eval()
+
+@log_funcall
+def load_model_and_tokenizer():
+    """Returns the text encoder selected by Config.TEXT_ENCODER_RUNTIME (see text_encoders) and the tokenizer."""
+    if Config.TEXT_ENCODER_RUNTIME == text_encoders.OPEN_CLIP:
+        import open_clip
+        return text_encoders.OpenClipTextEncoder(load_open_clip_text_model()), open_clip.get_tokenizer('ViT-B-32')
+    # Exported by scripts/export_text_encoder.py, with the tokenizer's BPE merges. No open_clip import, model 
+    # construction, weights download or torch.compile.
+    model = text_encoders.load_exported_text_encoder(Config.TEXT_ENCODER_RUNTIME, quantized=Config.TEXT_ENCODER_QUANTIZED)
+    return model, ClipTokenizer(text_encoders.get_tokenizer_path())
+
+@log_funcall
+def load_query_encoder(model, tokenizer):
+    cache = StatsCache(maxsize=Config.QUERY_EMBEDDING_CACHE_SIZE, ttl=Config.QUERY_EMBEDDING_CACHE_TTL)
+    query_encoder = QueryEncoder(model, tokenizer, cache)
+    num_warm_queries = query_encoder.load_warm_file(Config.QUERY_EMBEDDING_WARM_PATH)
+    print(f"INFO: Loaded {num_warm_queries} queries into the query embedding cache.")
+    # The first call triggers torch.compile, do it here rather than in the first search.
+    query_encoder.encode_batch(['warm up'])
+    return query_encoder
 
 @log_funcall
 def load_products_df():
     return pd.read_csv(os.path.join(Config.DATA_ROOT_DIR, 'products_minimal.csv'))
 
+def get_catalog_dir():
+    return os.path.join(Config.DATA_ROOT_DIR, 'catalog')
+
+@log_funcall
+def load_catalog():
+    # Built from products_minimal.csv by scripts/build_catalog.py. Falls back to converting the csv in memory.
+    if os.path.exists(os.path.join(get_catalog_dir(), 'meta.json')):
+        catalog = Catalog.load(get_catalog_dir())
+    else:
+        catalog = Catalog.from_dataframe(load_products_df())
+    
+    if Config.PRODUCT_JSON_ROUTES and catalog.product_json is None:
+        print("INFO: Pre-serialized product json not found in the catalog, building it.")
+        catalog.build_product_json()
+    return catalog
+
 @log_funcall
 def load_image_embeddings():
+    # Written by scripts/build_faiss_index.py --export_embeddings, already normalized. Memory-mapped read-only, 
+    # so all workers share the same pages through the page cache instead of holding a private copy each.
+    npy_filename = search_index.get_embeddings_path(Config.EMBEDDINGS_DTYPE)
+    if os.path.exists(npy_filename):
+        return np.load(npy_filename, mmap_mode='r')
+    
+    import torch
+    import torch.nn.functional as F
     filename = os.path.join(Config.DATA_ROOT_DIR, 'image_embeddings_normalized.pt')
     image_embeddings = F.normalize(torch.load(filename, weights_only=True), dim=-1).detach().numpy()
     return image_embeddings
     
 @log_funcall
 def load_faiss_index(image_embeddings):
-    faiss_index = faiss.IndexFlatIP(512)
-    faiss_index.add(image_embeddings) 
-    return faiss_index
+    index_type = Config.FAISS_INDEX_TYPE
+    index_path = search_index.get_index_path(index_type)
+    if index_type != search_index.FLAT and not os.path.exists(index_path):
+        print(f"CRITICAL: {index_path} not found, falling back to the flat index. Build it with scripts/build_faiss_index.py")
+        index_type = search_index.FLAT
+        index_path = search_index.get_index_path(index_type)
+    
+    if index_type == search_index.FLAT and not os.path.exists(index_path):
+        return search_index.build_index(image_embeddings, search_index.FLAT)
+    
+    faiss_index = search_index.read_index(index_path, mmap=Config.FAISS_INDEX_MMAP, index_type=index_type)
+    return search_index.set_search_params(faiss_index, index_type)
+
 
+def get_similar_products_cache_path():
+    return os.path.join(Config.DATA_ROOT_DIR, 'similar_products_cache.npy')
 
 @log_funcall
 def load_similar_products_cache():
-    return torch.load(os.path.join(Config.DATA_ROOT_DIR, 'similar_products_cache.pt'), weights_only=True)
+    """Returns the [num_products, K] int32 array of nearest neighbors of each product."""
+    # Written by scripts/convert_similar_products_cache.py. Memory-mapped, half the size of the int64 torch tensor.
+    if os.path.exists(get_similar_products_cache_path()):
+        return np.load(get_similar_products_cache_path(), mmap_mode='r')
+    import torch
+    similar_products_cache = torch.load(os.path.join(Config.DATA_ROOT_DIR, 'similar_products_cache.pt'), weights_only=True)
+    return similar_products_cache.numpy().astype(np.int32)
 
 @log_funcall
 def load_inspirations():
+    inspirations_obj = {'MAN' : [], 'WOMAN' : []}
     if Config.INSPIRATIONS_PATH:
-        return json.load(open(Config.INSPIRATIONS_PATH))
-    return {'MAN' : [], 'WOMAN' : []}
+        inspirations_obj = json.load(open(Config.INSPIRATIONS_PATH))
+    return Inspirations(inspirations_obj)
@@ -0,0 +1,106 @@
+import os
+import queue
+import threading
+import time
+
+
+class BatchWriter:
+    """Writes rows in the background : put() enqueues into a bounded queue, and a daemon thread calls
+    write_batch(rows) with up to max_batch_size rows, at least every max_wait_ms once rows are pending.
+
+    put() never blocks. When the queue is full the row is dropped and counted, we'd rather lose some
+    clicks than slow requests down. The thread is started lazily in each process, so it survives gunicorn's fork.
+    With idle_seconds, the thread also calls on_idle() after idle_seconds without rows, e.g. to close a segment.
+    """
+    def __init__(self, write_batch, max_queue_size=10000, max_batch_size=500, max_wait_ms=1000, on_idle=None,
+                 idle_seconds=None):
+        self.write_batch = write_batch
+        self.on_idle, self.idle_seconds = on_idle, idle_seconds
+        self.max_queue_size, self.max_batch_size, self.max_wait_ms = max_queue_size, max_batch_size, max_wait_ms
+        self.written, self.dropped, self.failed = 0, 0, 0
+        self._lock = threading.Lock()
+        self._pid, self._queue, self._thread = None, None, None
+
+    def put(self, row):
+        """Returns False if the row was dropped."""
+        self._start_if_needed()
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout=5):
+        """Synchronously writes everything still queued, then waits up to timeout seconds for the thread's
+        in-flight batch, e.g. at shutdown."""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        # Writes can't run concurrently with the thread's.
+        with self._lock:
+            while True:
+                rows = self._take(block=False)
+                if not rows:
+                    break
+                self._write(rows)
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks and deadline > time.monotonic():
+                self._queue.all_tasks_done.wait(deadline - time.monotonic())
+
+    def stats(self):
+        return {'queued' : self._queue.qsize() if self._queue is not None else 0,
+                'written' : self.written, 'dropped' : self.dropped, 'failed' : self.failed}
+
+    def _start_if_needed(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._thread = threading.Thread(target=self._run, name='batch-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _take(self, block, deadline=None):
+        rows = []
+        try:
+            if block:
+                rows.append(self._queue.get(timeout=self.idle_seconds))
+                deadline = time.monotonic() + self.max_wait_ms / 1000
+            while len(rows) < self.max_batch_size:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is None or timeout <= 0:
+                    rows.append(self._queue.get_nowait())
+                else:
+                    rows.append(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            pass
+        return rows
+
+    def _write(self, rows):
+        try:
+            self.write_batch(rows)
+            self.written += len(rows)
+        except Exception as e:
+            self.failed += len(rows)
+            print(f"ERROR: Writing {len(rows)} rows failed, {e=}")
+        finally:
+            for _ in rows:
+                self._queue.task_done()
+
+    def _run(self):
+        while True:
+            rows = self._take(block=True)
+            with self._lock:
+                if rows:
+                    self._write(rows)
+                elif self.on_idle is not None:
+                    self._idle()
+
+    def _idle(self):
+        try:
+            self.on_idle()
+        except Exception as e:
+            print(f"ERROR: on_idle failed, {e=}")
@@ -0,0 +1,35 @@
+import re
+import functools
+from flask import g, request
+from config import Config
+
+
+class BotDetector:
+    """Matches User-Agents against Config.SCRAPING_BOTS substrings (case insensitive) with one compiled regex,
+    memoizing verdicts since a handful of User-Agents make up most of the traffic."""
+    def __init__(self, patterns, memo_size=4096):
+        patterns = [pattern.lower() for pattern in patterns if pattern]
+        # Lowercasing first is several times faster than re.IGNORECASE.
+        self.regex = re.compile('|'.join(re.escape(pattern) for pattern in patterns)) if patterns else None
+        # lru_cache is implemented in C and thread-safe, cheaper than a locked cache for a sub-microsecond lookup.
+        self._memo = functools.lru_cache(maxsize=memo_size)(self._match)
+
+    def _match(self, user_agent):
+        return self.regex.search(user_agent.lower()) is not None
+
+    def is_bot(self, user_agent):
+        if self.regex is None or not user_agent:
+            return False
+        return self._memo(user_agent)
+
+    def stats(self):
+        info = self._memo.cache_info()
+        return {'size' : info.currsize, 'maxsize' : info.maxsize, 'hits' : info.hits, 'misses' : info.misses}
+
+
+bot_detector = BotDetector(Config.SCRAPING_BOTS, memo_size=Config.BOT_MEMO_SIZE)
+
+
+def detect_bot():
+    """before_request hook. Logging, feed and search read g.is_bot to short-circuit crawlers."""
+    g.is_bot = bot_detector.is_bot(request.headers.get('User-Agent', ''))
@@ -0,0 +1,57 @@
+import threading
+import cachetools
+
+
+class StatsCache:
+    """Thread-safe LRU cache with optional TTL eviction and hit/miss counters.
+
+    ttl=0 (or None) disables time based eviction and keeps a plain LRU.
+    """
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._cache = cachetools.TTLCache(maxsize, ttl) if ttl else cachetools.LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._cache.get(key, self)
+            if value is self:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        # cachetools raises ValueError if a single value is larger than maxsize.
+        with self._lock:
+            self._cache[key] = value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._cache.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def items(self):
+        with self._lock:
+            return list(self._cache.items())
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size' : len(self._cache),
+            'maxsize' : self.maxsize,
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'hit_rate' : (self.hits / total) if total else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._cache
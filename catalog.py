@@ -0,0 +1,159 @@
+import os
+import json
+import mmap
+import numpy as np
+
+# Fields used by the templates and the APIs.
+PRODUCT_COLUMNS = ('index', 'product_name', 'brand', 'price', 'primary_image', 'product_url', 'rating', 'rating_count')
+META_FILENAME = 'meta.json'
+
+
+class NumericColumn:
+    def __init__(self, values):
+        self.values = values
+
+    def take(self, indices):
+        return self.values[indices].tolist()
+
+    def save(self, directory, name):
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(self.values))
+        return {'kind' : 'numeric'}
+
+    @classmethod
+    def load(cls, directory, name):
+        return cls(np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r'))
+
+
+class StringColumn:
+    """Strings stored as one utf-8 byte pool plus an offsets array, i.e. row i is data[offsets[i]:offsets[i + 1]]."""
+    def __init__(self, offsets, data, nulls):
+        self.offsets, self.data, self.nulls = offsets, data, nulls
+
+    @classmethod
+    def from_values(cls, values):
+        """values are str, bytes or None / NaN for missing values."""
+        nulls = np.array([not isinstance(value, (str, bytes)) for value in values], dtype=bool)
+        encoded = [(value.encode() if isinstance(value, str) else value) if not null else b'' for value, null in zip(values, nulls)]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(offsets, b''.join(encoded), nulls)
+
+    def take(self, indices):
+        starts, ends, nulls = self.offsets[indices].tolist(), self.offsets[indices + 1].tolist(), self.nulls[indices].tolist()
+        data = self.data
+        return [None if null else data[start:end].decode() for start, end, null in zip(starts, ends, nulls)]
+
+    def take_bytes(self, indices):
+        """Raw bytes of the rows, without decoding. Missing values are b''."""
+        starts, ends = self.offsets[indices].tolist(), self.offsets[indices + 1].tolist()
+        data = self.data
+        return [data[start:end] for start, end in zip(starts, ends)]
+
+    def save(self, directory, name):
+        np.save(os.path.join(directory, f'{name}.offsets.npy'), self.offsets)
+        np.save(os.path.join(directory, f'{name}.nulls.npy'), self.nulls)
+        with open(os.path.join(directory, f'{name}.bytes'), 'wb') as f:
+            f.write(self.data)
+        return {'kind' : 'string'}
+
+    @classmethod
+    def load(cls, directory, name):
+        offsets = np.load(os.path.join(directory, f'{name}.offsets.npy'), mmap_mode='r')
+        nulls = np.load(os.path.join(directory, f'{name}.nulls.npy'), mmap_mode='r')
+        with open(os.path.join(directory, f'{name}.bytes'), 'rb') as f:
+            # mmap can't map empty files.
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+        return cls(offsets, data, nulls)
+
+
+COLUMN_KINDS = {'numeric' : NumericColumn, 'string' : StringColumn}
+# Pre-serialized JSON object of each product (PRODUCT_COLUMNS), stored like a string column.
+PRODUCT_JSON = 'product_json'
+
+
+class Catalog:
+    """Read-only, column oriented product table. Saved catalogs are memory-mapped, so workers share the pages."""
+    def __init__(self, columns, num_rows, product_json=None):
+        self.columns, self.num_rows = columns, num_rows
+        self.product_json = product_json
+
+    def __len__(self):
+        return self.num_rows
+
+    @classmethod
+    def from_dataframe(cls, df, columns=PRODUCT_COLUMNS):
+        catalog_columns = {}
+        for name in columns:
+            series = df[name]
+            if series.dtype.kind in 'biuf':
+                catalog_columns[name] = NumericColumn(series.to_numpy())
+            else:
+                catalog_columns[name] = StringColumn.from_values(series.tolist())
+        return cls(catalog_columns, len(df))
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        meta = {'num_rows' : self.num_rows, 'columns' : {}}
+        for name, column in self.columns.items():
+            meta['columns'][name] = column.save(directory, name)
+        if self.product_json is not None:
+            self.product_json.save(directory, PRODUCT_JSON)
+            meta[PRODUCT_JSON] = True
+        # Written last, so a catalog directory with meta.json is always complete.
+        with open(os.path.join(directory, META_FILENAME), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, META_FILENAME)) as f:
+            meta = json.load(f)
+        columns = {name : COLUMN_KINDS[info['kind']].load(directory, name) for name, info in meta['columns'].items()}
+        product_json = StringColumn.load(directory, PRODUCT_JSON) if meta.get(PRODUCT_JSON) else None
+        return cls(columns, meta['num_rows'], product_json=product_json)
+
+    def get_rows(self, indices, columns=None):
+        """Returns a list of product dicts for the indices, with only the requested columns (default all)."""
+        columns = columns or tuple(self.columns.keys())
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        if len(indices) == 0:
+            return []
+        values = [self.columns[name].take(indices) for name in columns]
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+    def get_row(self, index, columns=None):
+        return self.get_rows([index], columns=columns)[0]
+
+    def build_product_json(self, batch_size=65536):
+        """Serializes every product once, so responses can be spliced together from the fragments."""
+        fragments = []
+        for start in range(0, self.num_rows, batch_size):
+            rows = self.get_rows(np.arange(start, min(start + batch_size, self.num_rows)))
+            fragments.extend(json.dumps(row, separators=(',', ':')).encode() for row in rows)
+        self.product_json = StringColumn.from_values(fragments)
+
+    def get_json(self, indices, **extra_columns):
+        """Returns the products as a serialized JSON array, equivalent to json.dumps(self.get_rows(indices)).
+        extra_columns are per-row values appended to each object, e.g. is_wishlisted=[True, False, ...]."""
+        if self.product_json is None:
+            rows = self.get_rows(indices)
+            for name, values in extra_columns.items():
+                for row, value in zip(rows, values):
+                    row[name] = value
+            return json.dumps(rows, separators=(',', ':')).encode()
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        fragments = self.product_json.take_bytes(indices)
+        if extra_columns:
+            names = [json.dumps(name).encode() for name in extra_columns]
+            suffixes = zip(*[[json.dumps(value).encode() for value in values] for values in extra_columns.values()])
+            fragments = [fragment[:-1] + b''.join(b',' + name + b':' + value for name, value in zip(names, suffix)) + b'}'
+                         for fragment, suffix in zip(fragments, suffixes)]
+        return b'[' + b','.join(fragments) + b']'
+
+    def get_json_object(self, index, **extra_fields):
+        """Returns a single serialized product, with extra_fields appended to the object."""
+        if self.product_json is None:
+            return json.dumps({**self.get_row(index), **extra_fields}, separators=(',', ':')).encode()
+        fragment = self.product_json.take_bytes(np.array([index], dtype=np.int64))[0]
+        if not extra_fields:
+            return fragment
+        return fragment[:-1] + b',' + json.dumps(extra_fields, separators=(',', ':')).encode()[1:]
@@ -0,0 +1,106 @@
+import os
+import glob
+import json
+import socket
+import threading
+import time
+from datetime import datetime
+
+OPEN_SUFFIX, CLOSED_SUFFIX = '.jsonl.open', '.jsonl'
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value)} is not JSON serializable")
+
+
+class SegmentLog:
+    """Append-only JSONL log split into segment files, one writer per process.
+
+    Rows are appended to <prefix>-<host>-<pid>-<timestamp>.jsonl.open, which is renamed to .jsonl once it
+    reaches max_bytes, is older than max_seconds at the next write or close_expired(), or at close(). Only
+    closed segments, and .open segments of dead writers, are picked up by scripts/load_click_logs.py.
+    """
+    def __init__(self, directory, prefix='user_click', max_bytes=64 * 1024 * 1024, max_seconds=300):
+        self.directory, self.prefix = directory, prefix
+        self.max_bytes, self.max_seconds = max_bytes, max_seconds
+        self._lock = threading.Lock()
+        self._file, self._path, self._pid, self._opened_at = None, None, None, None
+
+    def write(self, rows):
+        data = ''.join(json.dumps(row, separators=(',', ':'), default=_default) + '\n' for row in rows).encode()
+        with self._lock:
+            if self._file is not None and (self._pid != os.getpid() or time.time() - self._opened_at > self.max_seconds):
+                self._close()
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._close()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def close_expired(self):
+        """Closes the segment if it's older than max_seconds, so idle writers don't keep segments open."""
+        with self._lock:
+            if self._file is not None and time.time() - self._opened_at > self.max_seconds:
+                self._close()
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._pid, self._opened_at = os.getpid(), time.time()
+        name = f"{self.prefix}-{socket.gethostname()}-{self._pid}-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}"
+        self._path = os.path.join(self.directory, name + OPEN_SUFFIX)
+        self._file = open(self._path, 'ab')
+
+    def _close(self):
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+            # A forked child inherits the parent's handle, only the owner renames the segment.
+            if self._pid == os.getpid():
+                os.replace(self._path, self._path[:-len(OPEN_SUFFIX)] + CLOSED_SUFFIX)
+        except FileNotFoundError:
+            print(f"ERROR: Segment {self._path} was moved while open, rows written since may be lost.")
+        finally:
+            self._file, self._path = None, None
+
+
+def _writer_is_alive(path, prefix):
+    """Whether the process that wrote the .open segment may still be running. Writers on other hosts can't be
+    checked, and are assumed alive."""
+    name = os.path.basename(path)[len(prefix) + 1 : -len(OPEN_SUFFIX)]
+    host, pid, _ = name.rsplit('-', 2)
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def closed_segments(directory, prefix='user_click', stale_seconds=None):
+    """Closed segments, oldest first. With stale_seconds, also .open segments not written to for that long whose
+    writer is dead, e.g. left behind by a killed worker. Live writers close their segments themselves."""
+    paths = glob.glob(os.path.join(directory, f'{prefix}-*{CLOSED_SUFFIX}'))
+    if stale_seconds is not None:
+        paths += [path for path in glob.glob(os.path.join(directory, f'{prefix}-*{OPEN_SUFFIX}'))
+                  if time.time() - os.path.getmtime(path) > stale_seconds and not _writer_is_alive(path, prefix)]
+    return sorted(paths, key=os.path.getmtime)
+
+
+def read_segment(path):
+    """Yields the rows of a segment. A partially written last line (killed writer) is skipped."""
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            yield json.loads(line)
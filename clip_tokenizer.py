@@ -0,0 +1,91 @@
+"""CLIP BPE tokenizer, numpy only, for the exported text encoders (TEXT_ENCODER_RUNTIME=TORCHSCRIPT / ONNX).
+
+Same tokens as open_clip.get_tokenizer('ViT-B-32') (open_clip's SimpleTokenizer with clean='lower', itself copied from
+https://github.com/openai/CLIP, MIT License, Copyright (c) 2021 OpenAI), without importing open_clip and torch.
+The BPE merges file is copied next to the exported model by scripts/export_text_encoder.py.
+"""
+import functools
+import gzip
+import html
+import ftfy
+import numpy as np
+import regex
+
+CONTEXT_LENGTH = 77
+NUM_MERGES = 49152 - 256 - 2
+START_OF_TEXT, END_OF_TEXT = '<start_of_text>', '<end_of_text>'
+_TOKEN_PATTERN = regex.compile(START_OF_TEXT + '|' + END_OF_TEXT + r"""|'s|'t|'re|'ve|'m|'ll|'d|[\p{L}]+|[\p{N}]|[^\s\p{L}\p{N}]+""",
+                               regex.IGNORECASE)
+_WHITESPACE = regex.compile(r'\s+')
+
+
+def bytes_to_unicode():
+    """Reversible mapping of utf-8 bytes to printable unicode characters, which the BPE merges are written in."""
+    bs = list(range(ord('!'), ord('~') + 1)) + list(range(ord('¡'), ord('¬') + 1)) + list(range(ord('®'), ord('ÿ') + 1))
+    cs = bs[:]
+    n = 0
+    for b in range(2 ** 8):
+        if b not in bs:
+            bs.append(b)
+            cs.append(2 ** 8 + n)
+            n += 1
+    return dict(zip(bs, [chr(c) for c in cs]))
+
+
+class ClipTokenizer:
+    def __init__(self, bpe_path, context_length=CONTEXT_LENGTH, memo_size=65536):
+        self.byte_encoder = bytes_to_unicode()
+        with gzip.open(bpe_path) as f:
+            merges = f.read().decode('utf-8').split('\n')[1:NUM_MERGES + 1]
+        merges = [tuple(merge.split()) for merge in merges]
+        vocab = list(self.byte_encoder.values())
+        vocab = vocab + [v + '</w>' for v in vocab] + [''.join(merge) for merge in merges] + [START_OF_TEXT, END_OF_TEXT]
+        self.encoder = {token : i for i, token in enumerate(vocab)}
+        self.bpe_ranks = {merge : i for i, merge in enumerate(merges)}
+        self.sot_token_id, self.eot_token_id = self.encoder[START_OF_TEXT], self.encoder[END_OF_TEXT]
+        self.context_length = context_length
+        # Queries repeat the same words, bounded since they're user input.
+        self.bpe = functools.lru_cache(maxsize=memo_size)(self._bpe)
+
+    def _bpe(self, token):
+        if token in (START_OF_TEXT, END_OF_TEXT):
+            return token
+        word = tuple(token[:-1]) + (token[-1] + '</w>',)
+        while len(word) > 1:
+            pairs = set(zip(word[:-1], word[1:]))
+            bigram = min(pairs, key=lambda pair: self.bpe_ranks.get(pair, float('inf')))
+            if bigram not in self.bpe_ranks:
+                break
+            first, second = bigram
+            merged, i = [], 0
+            while i < len(word):
+                if i < len(word) - 1 and word[i] == first and word[i + 1] == second:
+                    merged.append(first + second)
+                    i += 2
+                else:
+                    merged.append(word[i])
+                    i += 1
+            word = tuple(merged)
+        return ' '.join(word)
+
+    def encode(self, text):
+        text = html.unescape(html.unescape(ftfy.fix_text(text))).strip()
+        text = _WHITESPACE.sub(' ', text).strip().lower()
+        tokens = []
+        for token in _TOKEN_PATTERN.findall(text):
+            token = ''.join(self.byte_encoder[b] for b in token.encode('utf-8'))
+            tokens.extend(self.encoder[bpe_token] for bpe_token in self.bpe(token).split(' '))
+        return tokens
+
+    def __call__(self, texts):
+        """Returns the int64 tokens of shape [len(texts), context_length], zero padded and truncated like open_clip."""
+        if isinstance(texts, str):
+            texts = [texts]
+        result = np.zeros((len(texts), self.context_length), dtype=np.int64)
+        for i, text in enumerate(texts):
+            tokens = [self.sot_token_id] + self.encode(text) + [self.eot_token_id]
+            if len(tokens) > self.context_length:
+                tokens = tokens[:self.context_length]
+                tokens[-1] = self.eot_token_id
+            result[i, :len(tokens)] = tokens
+        return result
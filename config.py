@@ -37,14 +37,99 @@ class Config(object):
     
     SCRAPING_BOTS = os.environ.get('SCRAPING_BOTS', 'semrushbot,dataforseobot,ahrefsbot,amazonbot,googlebot,bingbot,openai.com')
     SCRAPING_BOTS = [x.strip() for x in SCRAPING_BOTS.split(',') if x.strip()]
+    # Number of distinct User-Agents whose bot verdict is memoized (bots.bot_detector).
+    BOT_MEMO_SIZE = int(os.environ.get('BOT_MEMO_SIZE', 4096))
+    
+    # Cache of per-user wishlists and recent clicks (user_state.py), written through on toggles / clicks.
+    # NONE : wishlists read SQL, recent clicks and user snapshots are cached per worker for USER_STATE_WORKER_TTL seconds.
+    # LOCAL : everything in-process, only consistent with a single worker. REDIS : USER_STATE_REDIS_URL.
+    USER_STATE_BACKEND = os.environ.get('USER_STATE_BACKEND', 'NONE').upper()
+    USER_STATE_REDIS_URL = os.environ.get('USER_STATE_REDIS_URL', 'redis://localhost:6379/0')
+    USER_STATE_TTL = int(os.environ.get('USER_STATE_TTL', 3600))
+    USER_STATE_MAX_KEYS = int(os.environ.get('USER_STATE_MAX_KEYS', 200000))
+    # Expiring per-worker entries re-syncs them with the database, which also picks up clicks served by other workers.
+    USER_STATE_WORKER_TTL = int(os.environ.get('USER_STATE_WORKER_TTL', 300))
+    USER_STATE_WORKER_MAX_KEYS = int(os.environ.get('USER_STATE_WORKER_MAX_KEYS', 100000))
+    
+    # /api/wishlist?cursor=&limit= page sizes.
+    WISHLIST_PAGE_SIZE = int(os.environ.get('WISHLIST_PAGE_SIZE', 48))
+    WISHLIST_MAX_PAGE_SIZE = int(os.environ.get('WISHLIST_MAX_PAGE_SIZE', 200))
+    
+    # Verified auth_info cookies cached per worker (cookie_handler.verified_cookies). 0 disables the cache.
+    AUTH_COOKIE_CACHE_SIZE = int(os.environ.get('AUTH_COOKIE_CACHE_SIZE', 10000))
+    AUTH_COOKIE_CACHE_TTL = int(os.environ.get('AUTH_COOKIE_CACHE_TTL', 600))
 
         
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     # Geed feed defaults.
-    FEED_MINIMUM_CLICKS = os.environ.get('FEED_MINIMUM_CLICKS', 5)
-    FEED_NUM_PRODUCTS = os.environ.get('FEED_NUM_PRODUCTS', 256)
-    FEED_CLICK_SAMPLE = os.environ.get('FEED_CLICK_SAMPLE', 32)
+    FEED_MINIMUM_CLICKS = int(os.environ.get('FEED_MINIMUM_CLICKS', 5))
+    FEED_NUM_PRODUCTS = int(os.environ.get('FEED_NUM_PRODUCTS', 256))
+    FEED_CLICK_SAMPLE = int(os.environ.get('FEED_CLICK_SAMPLE', 32))
+    # Weight of the i-th most recent click's neighbors is FEED_RECENCY_DECAY ** i.
+    FEED_RECENCY_DECAY = float(os.environ.get('FEED_RECENCY_DECAY', 0.9))
+    # Per-worker cache of taste vectors (FEED_MODE=TASTE_VECTOR). Expiring entries re-syncs them with the recent clicks,
+    # which also picks up clicks served by other workers.
+    FEED_TASTE_VECTOR_USERS = int(os.environ.get('FEED_TASTE_VECTOR_USERS', 100000))
+    FEED_TASTE_VECTOR_TTL = int(os.environ.get('FEED_TASTE_VECTOR_TTL', 300))
+    # NEIGHBORS : union of the recent clicks' similar products. TASTE_VECTOR : one index search with the recency-weighted
+    # mean embedding of the recent clicks (plus FEED_WISHLIST_WEIGHT x the mean wishlisted embedding), sampled from the 
+    # top FEED_TASTE_CANDIDATES x num_products results.
+    FEED_MODE = os.environ.get('FEED_MODE', 'NEIGHBORS').upper()
+    FEED_WISHLIST_WEIGHT = float(os.environ.get('FEED_WISHLIST_WEIGHT', 0.5))
+    FEED_TASTE_CANDIDATES = int(os.environ.get('FEED_TASTE_CANDIDATES', 2))
+    
+    # Load artifacts once in the gunicorn master (preload_app in gunicorn.conf.py) and move in-memory arrays into shared
+    # memory before forking, so N workers share one copy. Forces synchronous loading, threads don't survive a fork.
+    SHARED_ARTIFACTS = (os.environ.get('SHARED_ARTIFACTS', 'False').lower() == 'true')
+    
+    # Load artifacts (model, catalog, index, ...) in background threads, so a worker serves health checks and lightweight 
+    # routes immediately. Routes needing an artifact wait up to ARTIFACTS_WAIT_TIMEOUT seconds, then return 503.
+    ARTIFACTS_BACKGROUND_LOADING = (os.environ.get('ARTIFACTS_BACKGROUND_LOADING', str(DEPLOYMENT_TYPE != 'LOCAL')).lower() == 'true')
+    ARTIFACTS_WAIT_TIMEOUT = float(os.environ.get('ARTIFACTS_WAIT_TIMEOUT', 10))
+    
+    # Text encoder runtime. OPEN_CLIP builds the model and torch.compiles it. TORCHSCRIPT / ONNX load the text tower 
+    # exported by scripts/export_text_encoder.py from DATA_ROOT_DIR, optionally the int8 quantized one.
+    TEXT_ENCODER_RUNTIME = os.environ.get('TEXT_ENCODER_RUNTIME', 'OPEN_CLIP').upper()
+    TEXT_ENCODER_QUANTIZED = (os.environ.get('TEXT_ENCODER_QUANTIZED', 'False').lower() == 'true')
+    
+    # Query embedding cache. TTL is in seconds, 0 disables time based eviction.
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', 8192))
+    QUERY_EMBEDDING_CACHE_TTL = int(os.environ.get('QUERY_EMBEDDING_CACHE_TTL', 0))
+    # .npz file with `queries` and `embeddings`, loaded into the cache at startup.
+    QUERY_EMBEDDING_WARM_PATH = os.environ.get('QUERY_EMBEDDING_WARM_PATH', '')
+    
+    # Search micro-batching. Concurrent searches are encoded and searched as one batch of up to
+    # SEARCH_BATCH_MAX_SIZE, waiting at most SEARCH_BATCH_MAX_WAIT_MS. A lone search runs immediately.
+    SEARCH_BATCHING = (os.environ.get('SEARCH_BATCHING', 'True').lower() == 'true')
+    SEARCH_BATCH_MAX_SIZE = int(os.environ.get('SEARCH_BATCH_MAX_SIZE', 32))
+    SEARCH_BATCH_MAX_WAIT_MS = float(os.environ.get('SEARCH_BATCH_MAX_WAIT_MS', 3))
+    
+    # Search results cache, keyed by (normalized query, n).
+    SEARCH_RESULTS_CACHE_SIZE = int(os.environ.get('SEARCH_RESULTS_CACHE_SIZE', 4096))
+    SEARCH_RESULTS_CACHE_TTL = int(os.environ.get('SEARCH_RESULTS_CACHE_TTL', 0))
+    
+    # FAISS index. One of FLAT, IVF_FLAT, HNSW, IVF_PQ, SQ_FP16, SQ8, IVF_SQ8. Indexes are built offline with 
+    # scripts/build_faiss_index.py and read from DATA_ROOT_DIR. Only FLAT can be built at startup.
+    FAISS_INDEX_TYPE = os.environ.get('FAISS_INDEX_TYPE', 'FLAT').upper()
+    # float32 or float16. Selects which exported image_embeddings_normalized*.npy is memory-mapped.
+    EMBEDDINGS_DTYPE = os.environ.get('EMBEDDINGS_DTYPE', 'float32').lower()
+    # Prebuilt index files (including faiss_flat.index) are memory-mapped read-only so workers share them. On the
+    # pinned faiss-cpu 1.7.4 only IVF inverted lists are, flat / SQ / HNSW codes need a faiss with IO_FLAG_MMAP_IFC.
+    FAISS_INDEX_MMAP = (os.environ.get('FAISS_INDEX_MMAP', 'True').lower() == 'true')
+    # Build time parameters.
+    FAISS_NLIST = int(os.environ.get('FAISS_NLIST', 4096))
+    FAISS_HNSW_M = int(os.environ.get('FAISS_HNSW_M', 32))
+    FAISS_EF_CONSTRUCTION = int(os.environ.get('FAISS_EF_CONSTRUCTION', 200))
+    FAISS_PQ_M = int(os.environ.get('FAISS_PQ_M', 64))
+    # Query time parameters. efSearch should stay above the number of results we ask for (129).
+    FAISS_NPROBE = int(os.environ.get('FAISS_NPROBE', 64))
+    FAISS_EF_SEARCH = int(os.environ.get('FAISS_EF_SEARCH', 256))
+    
+    # Endpoints that splice responses from pre-serialized product JSON instead of jsonify-ing dicts.
+    # Any of api_query, api_feed, api_product, api_wishlist.
+    PRODUCT_JSON_ROUTES = os.environ.get('PRODUCT_JSON_ROUTES', 'api_query')
+    PRODUCT_JSON_ROUTES = [x.strip() for x in PRODUCT_JSON_ROUTES.split(',') if x.strip()]
     
     # Inspirations Path
     INSPIRATIONS_PATH = os.environ.get('INSPIRATIONS_PATH', '')
@@ -57,6 +142,18 @@ class Config(object):
     PREFERRED_URL_SCHEME = 'https' if (DEPLOYMENT_TYPE != 'LOCAL') else 'http'
     
     LOGGING_DESTINATION = os.environ.get('LOGGING_DESTINATION', 'LOG')
+    # scripts/rollup_user_clicks.py moves user_click rows older than this into daily counts (user_click_daily).
+    USER_CLICK_RETENTION_DAYS = int(os.environ.get('USER_CLICK_RETENTION_DAYS', 180))
+    # With LOGGING_DESTINATION=DB, queue clicks and bulk insert them from a background thread, every LOGGING_BATCH_SIZE 
+    # rows or LOGGING_BATCH_WAIT_MS. Clicks are dropped (and counted in /readyz) when LOGGING_QUEUE_SIZE are pending.
+    LOGGING_ASYNC = (os.environ.get('LOGGING_ASYNC', 'True').lower() == 'true')
+    LOGGING_QUEUE_SIZE = int(os.environ.get('LOGGING_QUEUE_SIZE', 10000))
+    LOGGING_BATCH_SIZE = int(os.environ.get('LOGGING_BATCH_SIZE', 500))
+    LOGGING_BATCH_WAIT_MS = int(os.environ.get('LOGGING_BATCH_WAIT_MS', 1000))
+    # LOGGING_DESTINATION=FILE : rotating JSONL segments in LOGGING_FILE_DIR, loaded with scripts/load_click_logs.py.
+    LOGGING_FILE_DIR = os.environ.get('LOGGING_FILE_DIR', 'click_logs')
+    LOGGING_FILE_MAX_BYTES = int(os.environ.get('LOGGING_FILE_MAX_BYTES', 64 * 1024 * 1024))
+    LOGGING_FILE_MAX_SECONDS = int(os.environ.get('LOGGING_FILE_MAX_SECONDS', 300))
 
     # App URLs
     PLAY_STORE_URL = os.environ.get('PLAY_STORE_URL')
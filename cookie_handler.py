@@ -2,10 +2,16 @@
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from flask import g, request
 from config import Config
+from caches import StatsCache
 from uuid import uuid4
 
 assert Config.SECRET_KEY is not None
 serializer = URLSafeTimedSerializer(Config.SECRET_KEY)
+
+# auth_info cookie -> its verified payload, so returning clients skip the HMAC + base64 + JSON of serializer.loads.
+# Only cookies that verified are cached, and for at most AUTH_COOKIE_CACHE_TTL seconds (also past MAX_COOKIE_AGE).
+verified_cookies = StatsCache(maxsize=Config.AUTH_COOKIE_CACHE_SIZE, ttl=Config.AUTH_COOKIE_CACHE_TTL) \
+    if Config.AUTH_COOKIE_CACHE_SIZE else None
     
 # We persist the session id across login / logouts.
 def set_cookie_updates_for_new_session():
@@ -26,14 +32,15 @@ def get_auth_info():
     cookies = request.cookies
     auth_cookie = cookies.get('auth_info')
     
-    # New user.
+    # New user. Crawlers (g.is_bot, set by bots.detect_bot) don't keep cookies, don't sign a session for each request.
     if not auth_cookie:
-        set_cookie_updates_for_new_session()
+        if not g.get('is_bot'):
+            set_cookie_updates_for_new_session()
         return
     
     # Existing user.    
     try:
-        auth_cookie_decrypted = serializer.loads(auth_cookie, max_age=Config.MAX_COOKIE_AGE)
+        auth_cookie_decrypted = load_auth_cookie(auth_cookie)
         g.user_id, g.session_id = auth_cookie_decrypted.get('user_id'), auth_cookie_decrypted.get('session_id')
         for key in ['picture_url', 'gender', 'onboarding_stage', 'email']:
             setattr(g, key, cookies.get(key))
@@ -45,6 +52,16 @@ def get_auth_info():
         g.cookie_updates.clear()
         print("CRITICAL: Someone tampered cookies or the secret key is wrong!")
         
+def load_auth_cookie(auth_cookie):
+    """Verified payload of the auth_info cookie. Raises BadSignature / SignatureExpired like serializer.loads."""
+    if verified_cookies is None:
+        return serializer.loads(auth_cookie, max_age=Config.MAX_COOKIE_AGE)
+    payload = verified_cookies.get(auth_cookie)
+    if payload is None:
+        payload = serializer.loads(auth_cookie, max_age=Config.MAX_COOKIE_AGE)
+        verified_cookies.set(auth_cookie, payload)
+    return payload
+
 # @app.after_request registered in app.py
 def update_cookies(response):
     for key, value in g.cookie_updates.items():
@@ -55,7 +72,7 @@ def update_cookies(response):
 def set_cookie_updates_at_login(user):
     auth_info = serializer.dumps({
         'user_id' : user.id,
-        'session_id' : g.session_id or str(uuid.uuid4())
+        'session_id' : g.session_id or str(uuid4())
     })
     g.cookie_updates.update({
         'auth_info' : auth_info,
@@ -1,81 +1,151 @@
-import torch.nn.functional as F
 import artifacts_loader
 from models import WishlistItem, UserClick, User
 from config import Config
-import random
+import numpy as np
 from app import db
 from flask import g
+from sqlalchemy import delete, or_, and_
+from sqlalchemy.exc import IntegrityError
 import datetime
+import base64
+import json
+import types
 import cookie_handler
+from caches import StatsCache
+from query_encoder import normalize_query
+from search_batcher import SearchBatcher
+from artifact_registry import ArtifactRegistry
+import shared_artifacts
+import feed
+from user_state import user_state_cache
 
-model, tokenizer = artifacts_loader.load_model_and_tokenizer()
-products_df = artifacts_loader.load_products_df()
-image_embeddings = artifacts_loader.load_image_embeddings()
-faiss_index = artifacts_loader.load_faiss_index(image_embeddings)
-similar_products_cache = artifacts_loader.load_similar_products_cache()
-inspirations_obj = artifacts_loader.load_inspirations()
+# Artifacts are loaded in background threads (Config.ARTIFACTS_BACKGROUND_LOADING), so the worker can serve 
+# lightweight routes right away. Reading an artifact waits for it, raising ArtifactNotReady (503) on timeout.
+artifacts = ArtifactRegistry(wait_timeout=Config.ARTIFACTS_WAIT_TIMEOUT)
+artifacts.register('query_encoder', lambda: artifacts_loader.load_query_encoder(*artifacts_loader.load_model_and_tokenizer()))
+artifacts.register('catalog', artifacts_loader.load_catalog)
+artifacts.register('image_embeddings', artifacts_loader.load_image_embeddings)
+artifacts.register('faiss_index', artifacts_loader.load_faiss_index, deps=('image_embeddings',))
+artifacts.register('similar_products_cache', artifacts_loader.load_similar_products_cache)
+artifacts.register('inspirations', artifacts_loader.load_inspirations)
+artifacts.load_all(background=Config.ARTIFACTS_BACKGROUND_LOADING and not Config.SHARED_ARTIFACTS)
+if Config.SHARED_ARTIFACTS:
+    for name in ('catalog', 'image_embeddings', 'similar_products_cache'):
+        artifacts.set(name, shared_artifacts.share(artifacts[name]))
+
+search_batcher = SearchBatcher(get_query_encoder=lambda: artifacts['query_encoder'], get_index=lambda: artifacts['faiss_index'],
+                               max_batch_size=Config.SEARCH_BATCH_MAX_SIZE, max_wait_ms=Config.SEARCH_BATCH_MAX_WAIT_MS,
+                               enabled=Config.SEARCH_BATCHING)
+
+# (normalized query, n) -> {'indices' : top-n indices, 'products_json' : serialized products or None}
+search_results_cache = StatsCache(maxsize=Config.SEARCH_RESULTS_CACHE_SIZE, ttl=Config.SEARCH_RESULTS_CACHE_TTL)
 
 MAN, WOMAN = 'MAN', 'WOMAN'
 ONBOARDING_COMPLETE = 'COMPLETE'
 
+# Columns of the User snapshots kept in the user state cache, and returned by get_full_user.
+USER_SNAPSHOT_FIELDS = ('id', 'email', 'sub', 'name', 'given_name', 'family_name', 'picture_url', 'is_private_email',
+                        'gender', 'birth_year', 'onboarding_stage')
+
+def get_wishlist(user_id):
+    """Sorted array of the user's wishlisted product indexes. Loaded with one query per request and kept on g."""
+    if not user_id:
+        return np.zeros(0, dtype=np.int64)
+    wishlists = g.setdefault('wishlists', {})
+    if user_id not in wishlists:
+        wishlists[user_id] = np.unique(np.array(get_wishlist_indexes(user_id), dtype=np.int64))
+    return wishlists[user_id]
+
+def get_wishlist_indexes(user_id):
+    """The user's wishlisted product indexes, most recently added first, from the user state cache or SQL."""
+    def load():
+        wishlisted_products = db.session.query(WishlistItem.product_index).filter_by(user_id=user_id).order_by(WishlistItem.created_at.desc()).all()
+        return [product[0] for product in wishlisted_products]
+    return user_state_cache.get_wishlist(user_id, load)
+
 def is_wishlisted_product(product_id, user_id=None):
-    if (not user_id) or (not product_id):
-        return False
-    return WishlistItem.query.filter_by(user_id=user_id, product_index=product_id).first() is not None
+    return bool(np.isin(product_id, get_wishlist(user_id)))
 
-# DEPRECATED : Use faiss_index.search instead. 
-def getTopK(base_embedding, K=100):
-    global image_embeddings
-    probs = F.cosine_similarity(image_embeddings, base_embedding.view(1, 512))
-    topk_indices = probs.topk(K).indices
-    return topk_indices, probs[topk_indices]
+def _get_products(product_indices, as_json=False, user_id=None):
+    """Catalog rows for the indices, or with as_json the JSON array spliced from pre-serialized products.
+    With a user_id, every product also gets is_wishlisted."""
+    catalog = artifacts['catalog']
+    if not user_id:
+        return catalog.get_json(product_indices) if as_json else catalog.get_rows(product_indices)
+    
+    product_indices = np.asarray(product_indices, dtype=np.int64).reshape(-1)
+    is_wishlisted = np.isin(product_indices, get_wishlist(user_id)).tolist()
+    if as_json:
+        return catalog.get_json(product_indices, is_wishlisted=is_wishlisted)
+    products = catalog.get_rows(product_indices)
+    for product, wishlisted in zip(products, is_wishlisted):
+        product['is_wishlisted'] = wishlisted
+    return products
 
-def get_search_results(query, n = 128):
-    """Returns a list of n matching products or empty list if query is empty."""
-    global tokenizer, faiss_index, products_df
-    if not query:
-        return []
+def _get_cached_search_result(query, n):
+    """Returns the search results cache entry for the query, running the search on a miss."""
+    key = (normalize_query(query), n)
+    result = search_results_cache.get(key)
+    if result is not None:
+        return result
+    
+    # Encodes the query and searches faiss_index, batched with concurrent searches.
+    topk_indices = search_batcher.search(query, n + 1) # shape = [n + 1]
+    # Approximate indexes return -1 when they find fewer than n + 1 results.
+    topk_indices = topk_indices[topk_indices >= 0]
     
-    query_encoding = tokenizer(query)
-    query_embedding = F.normalize(model.encode_text(query_encoding), dim=-1) # shape = [1, DIM]
+    result = {'indices' : topk_indices, 'products_json' : None}
+    # Crawlers get the same results as users, but walk the long tail of queries : they'd evict the entries real users hit.
+    if not g.get('is_bot'):
+        search_results_cache.set(key, result)
+    return result
 
-    ## faiss_index.search expects batched inputs.
-    topk_scores, topk_indices = faiss_index.search(query_embedding.detach().numpy(),  n + 1) 
-    topk_scores, topk_indices = topk_scores[0], topk_indices[0]
+def get_search_results(query, n = 128, as_json=False, user_id=None):
+    """Returns a list of n matching products or empty list if query is empty."""
+    if not query:
+        # Without touching the catalog, so it doesn't wait for artifacts to load.
+        return b'[]' if as_json else []
     
-    # Return top n products.
-    return products_df.iloc[topk_indices].to_dict('records')
+    catalog = artifacts['catalog']
+    result = _get_cached_search_result(query, n)
+    if user_id:
+        # is_wishlisted is per user, so the cached products_json can't be reused.
+        return _get_products(result['indices'], as_json=as_json, user_id=user_id)
+    if not as_json:
+        # Return top n products.
+        return catalog.get_rows(result['indices'])
     
-# TODO : Add wishlisted.
-def get_product(product_id, user_id=None):
+    # Serialized lazily, since only /api/query needs it. Concurrent misses may both serialize, which is harmless.
+    if result['products_json'] is None:
+        result['products_json'] = catalog.get_json(result['indices'])
+    return result['products_json']
+
+def get_product(product_id, user_id=None, as_json=False):
     """Returns the product for the product id, or None if product_id is invalid."""
-    if product_id >= len(products_df):
+    catalog = artifacts['catalog']
+    if product_id >= len(catalog):
         return None
     
-    product = products_df.iloc[product_id].to_dict()
-    product['is_wishlisted'] = is_wishlisted_product(product_id=product_id, user_id=user_id)
+    is_wishlisted = is_wishlisted_product(product_id=product_id, user_id=user_id)
+    if as_json:
+        return catalog.get_json_object(product_id, is_wishlisted=is_wishlisted)
+    product = catalog.get_row(product_id)
+    product['is_wishlisted'] = is_wishlisted
     return product
 
-def get_similar_products(product_id, n = 128):
+def get_similar_products(product_id, n = 128, as_json=False, user_id=None):
     """Returns a list of n similar products for the product_id or empty list if product_id is invalid."""
-    global similar_products_cache, products_df
+    similar_products_cache = artifacts['similar_products_cache']
 
     if product_id >= similar_products_cache.shape[0]:
-        return []
+        return _get_products([], as_json=as_json)
     topk_indices = similar_products_cache[product_id][:n]
-    return products_df.iloc[topk_indices].to_dict('records')
+    return _get_products(topk_indices, as_json=as_json, user_id=user_id)
 
 
-def get_inspirations(gender):
-    """Returns inspirations for the given gender or empty if gender is invalid."""
-    global inspirations_obj
-    
-    def shuffled_inspirations(inspirations):
-        for insp in inspirations:
-            random.shuffle(insp['products'])
-        random.shuffle(inspirations)
-        return inspirations
-    
+def get_inspirations(gender, as_json=False):
+    """Returns shuffled inspirations for the given gender (WOMAN if invalid), and the lowercase gender."""
+    inspirations = artifacts['inspirations']
 
     # Try to get gender from cookies. 
     gender = gender or g.get('gender')
@@ -85,43 +155,63 @@ def get_inspirations(gender):
     if gender not in (MAN, WOMAN):
         gender = WOMAN
 
-    return shuffled_inspirations(inspirations_obj[gender]), gender.lower()
+    if as_json:
+        return inspirations.shuffled_json(gender), gender.lower()
+    return inspirations.shuffled(gender), gender.lower()
 
-def get_default_feed(gender, num_products):
-    global products_df
-    feed_products_indexes = [product['index'] for insp in inspirations_obj[gender] for product in insp['products']]
-    sampled_feed_indexes = random.sample(feed_products_indexes,
-                                         min(num_products, len(feed_products_indexes)))
-    return products_df.iloc[sampled_feed_indexes].to_dict('records')
+def get_default_feed(gender, num_products, as_json=False, user_id=None):
+    sampled_feed_indexes = artifacts['inspirations'].sample_products(gender, num_products)
+    return _get_products(sampled_feed_indexes, as_json=as_json, user_id=user_id)
 
-def get_feed(user_id, num_products=None):
-    global products_df
-    
+def get_feed(user_id, num_products=None, as_json=False):
     num_products = num_products or Config.FEED_NUM_PRODUCTS
     # TODO : Only on /api/feed. This is only for early testing for iOS. Remove.
     if not user_id:
-        return get_default_feed(WOMAN, num_products=num_products)
+        return get_default_feed(WOMAN, num_products=num_products, as_json=as_json)
+    # Crawlers don't need a personalized feed.
+    if g.get('is_bot'):
+        return get_default_feed(gender=(g.get('gender') or WOMAN), num_products=num_products, as_json=as_json)
+    
+    # Get clicked products, from the user state cache when the user is warm.
+    clicked_products = user_state_cache.get_recent_clicks(user_id, lambda: get_recent_clicked_products(user_id))
+    
+    # Return feed from inspirations if user hasn't made some clicks yet.
+    if len(clicked_products) < Config.FEED_MINIMUM_CLICKS:
+        return get_default_feed(gender=(g.get('gender') or WOMAN), num_products=num_products, as_json=as_json, user_id=user_id) # g.gender=None => g.get('gender', WOMAN) = None
     
-    # Get clicked products.
+    wishlisted_products = get_wishlist(user_id).tolist()
+    if Config.FEED_MODE == feed.TASTE_VECTOR:
+        sampled_feed_indexes = get_taste_feed_indexes(user_id, clicked_products, wishlisted_products, num_products)
+    else:
+        # sample feed products, weighted by click recency and neighbor rank, skipping wishlisted ones.
+        sampled_feed_indexes = feed.sample_feed(clicked_products, artifacts['similar_products_cache'], num_products,
+                                                exclude=wishlisted_products)
+    
+    # Wishlisted products are excluded, so they're all is_wishlisted=False, but the field is kept for consistency.
+    return _get_products(sampled_feed_indexes, as_json=as_json, user_id=user_id)
+
+
+def get_taste_feed_indexes(user_id, clicked_products, wishlisted_products, num_products):
+    """Searches the index once around the user's taste vector, skipping products already clicked or wishlisted."""
+    image_embeddings = artifacts['image_embeddings']
+    click_vector = feed.taste_vectors.get(user_id, image_embeddings)
+    if click_vector is None:
+        click_vector = feed.taste_vector(clicked_products, image_embeddings)
+        feed.taste_vectors.seed(user_id, click_vector)
+    wishlisted_embeddings = np.asarray(image_embeddings[[index for index in wishlisted_products if index < len(image_embeddings)]])
+    return feed.sample_taste_feed(click_vector, wishlisted_embeddings, artifacts['faiss_index'], num_products,
+                                  exclude=set(clicked_products) | set(wishlisted_products))
+
+
+def get_recent_clicked_products(user_id):
+    """Most recently clicked distinct products of the user, most recent first."""
     clicks = UserClick.query.with_entities(UserClick.product_index, UserClick.clicked_at) \
         .filter_by(user_id=user_id) \
         .filter(UserClick.product_index.isnot(None)) \
         .order_by(UserClick.clicked_at.desc()) \
-        .distinct() \
         .limit(Config.FEED_CLICK_SAMPLE) \
         .all()
-    clicked_products = [click.product_index for click in clicks]
-    
-    # Return feed from inspirations if user hasn't made some clicks yet.
-    if len(clicked_products) < Config.FEED_MINIMUM_CLICKS:
-        return get_default_feed(gender=(g.get('gender') or WOMAN), num_products=num_products) # g.gender=None => g.get('gender', WOMAN) = None
-    
-    # sample feed porducts. 
-    feed_products_indexes = list(set(similar_products_cache[clicked_products].view(-1).detach().tolist()))
-    sampled_feed_indexes = random.sample(feed_products_indexes,
-                                         min(num_products, len(feed_products_indexes)))
-    
-    return products_df.iloc[sampled_feed_indexes].to_dict('records')
+    return list(dict.fromkeys(click.product_index for click in clicks))
 
 
 def create_user_if_needed(user_info):
@@ -136,6 +226,7 @@ def create_user_if_needed(user_info):
             user = User.query.filter_by(sub=user_info['sub']).first()
             
         if user:
+            _cache_user_snapshot(user)
             return user
         user = User(auth_id=user_info.get('id'),
                     email=user_info.get('email'),
@@ -149,12 +240,27 @@ def create_user_if_needed(user_info):
         db.session.add(user)
         print(f"INFO: Created {user=}")
         db.session.commit()
+        _cache_user_snapshot(user)
         return user
     except Exception as e:
         print(f"CRITICAL : User couldn't login. {user_info=}, {e=}")
     return None
 
+def _user_snapshot(user):
+    return {field : getattr(user, field) for field in USER_SNAPSHOT_FIELDS} if user else None
+
+def _cache_user_snapshot(user):
+    # The first request after login (usually /api/profile) reads it instead of SQL. Overwrites any cached snapshot,
+    # the row was just read or written.
+    try:
+        user_state_cache.set_user(user.id, _user_snapshot(user))
+    except Exception as e:
+        print(f"ERROR: Caching user snapshot failed {user.id=}, {e=}")
+
 def get_full_user():
+    """Snapshot of the logged in user (attributes of USER_SNAPSHOT_FIELDS), from the user state cache or SQL.
+    
+    Read only, update the User row with SQL and call user_state_cache.invalidate_user instead."""
     if not g.user_id:
         return None
     if g.get('current_user'):
@@ -162,7 +268,8 @@ def get_full_user():
 
     g.current_user = None
     try:
-        g.current_user = User.query.filter_by(id=g.user_id).first()
+        snapshot = user_state_cache.get_user(g.user_id, lambda: _user_snapshot(User.query.filter_by(id=g.user_id).first()))
+        g.current_user = types.SimpleNamespace(**snapshot) if snapshot else None
     except ValueError as e:
         print(f"CRITICAL: Incorrect user_id in cookies. {g.user_id=}, {e=}")
     except Exception as e:
@@ -170,35 +277,104 @@ def get_full_user():
         
     return g.current_user
 
-def get_wishlisted_products(user_id):
-    global products_df
+def _update_user(user_id, **values):
+    """Updates the User row with one UPDATE and invalidates its snapshot. Returns whether the user exists."""
+    updated = User.query.filter_by(id=user_id).update(values) > 0
+    db.session.commit()
+    g.pop('current_user', None)
+    user_state_cache.invalidate_user(user_id)
+    return updated
+
+def delete_account(user_id):
+    try:
+        if not _update_user(user_id, onboarding_stage=None, gender=None, birth_year=None):
+            print(f"ERROR: Deleting unknown user {user_id=}")
+    except Exception as e:
+        db.session.rollback()
+        print("ERROR: Error deleting user: ", e)
+
+def get_wishlisted_products(user_id, as_json=False):
     if not user_id:
-        return [], "User not authenticated"
+        return _get_products([], as_json=as_json), "User not authenticated"
+    catalog = artifacts['catalog']
     try:
-        wishlisted_products = db.session.query(WishlistItem.product_index).filter_by(user_id=user_id).order_by(WishlistItem.created_at.desc()).all()
-        wishlisted_valid_indices = [index[0] for index in wishlisted_products if index[0] < len(products_df)]
-        return products_df.iloc[wishlisted_valid_indices].to_dict('records'), None
+        wishlisted_valid_indices = [index for index in get_wishlist_indexes(user_id) if index < len(catalog)]
+        return _get_products(wishlisted_valid_indices, as_json=as_json), None
     except Exception as e:
         print(f'ERROR: fetching wishlist {user_id=}, {e=}')
-        return [], e
+        return _get_products([], as_json=as_json), e
     
+def _encode_wishlist_cursor(item):
+    created_at = item.created_at.isoformat() if item.created_at else None
+    return base64.urlsafe_b64encode(json.dumps([created_at, item.id]).encode()).decode()
+
+def _decode_wishlist_cursor(cursor):
+    """Returns (created_at, id) of the last item of the previous page. Raises ValueError for invalid cursors."""
+    try:
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.datetime.fromisoformat(created_at) if created_at else None), int(item_id)
+    except Exception as e:
+        raise ValueError(f"Invalid wishlist cursor {cursor=}") from e
+
+def get_wishlisted_products_page(user_id, cursor=None, limit=None, as_json=False):
+    """Returns (products, next_cursor, error) for one page of the wishlist, most recently added first.
+    
+    Keyset pagination on (created_at, id), served by the (user_id, created_at) index. next_cursor is None on the last 
+    page. Rows without created_at (older rows) sort last in descending order on SQL Server and SQLite.
+    """
+    limit = limit or Config.WISHLIST_PAGE_SIZE
+    position = _decode_wishlist_cursor(cursor) if cursor else None
+    catalog = artifacts['catalog']
+    try:
+        # No product_index range filter in SQL, it makes planners pick the unique index and sort.
+        query = db.session.query(WishlistItem.id, WishlistItem.product_index, WishlistItem.created_at) \
+            .filter(WishlistItem.user_id == user_id)
+        if position:
+            created_at, item_id = position
+            if created_at is None:
+                query = query.filter(WishlistItem.created_at.is_(None), WishlistItem.id < item_id)
+            else:
+                query = query.filter(or_(WishlistItem.created_at < created_at,
+                                         and_(WishlistItem.created_at == created_at, WishlistItem.id < item_id),
+                                         WishlistItem.created_at.is_(None)))
+        items = query.order_by(WishlistItem.created_at.desc(), WishlistItem.id.desc()).limit(limit + 1).all()
+        next_cursor = _encode_wishlist_cursor(items[limit - 1]) if len(items) > limit else None
+        # Products no longer in the catalog are skipped, so a page can be shorter than limit.
+        product_indices = [item.product_index for item in items[:limit] if 0 <= item.product_index < len(catalog)]
+        return _get_products(product_indices, as_json=as_json), next_cursor, None
+    except Exception as e:
+        db.session.rollback()
+        print(f'ERROR: fetching wishlist page {user_id=}, {cursor=}, {e=}')
+        return _get_products([], as_json=as_json), None, e
+
 def get_wishlisted_status(user_id, product_id):
+    """Toggles the product in the user's wishlist, returns (wishlisted, error).
+    
+    Deletes first, and inserts only if nothing was deleted, committed once. With the unique (user_id, product_index) 
+    constraint, an insert racing with another one (e.g. a double tap) fails, and the product is wishlisted either way.
+    """
+    # Drop the request's wishlist, it's about to change.
+    g.get('wishlists', {}).pop(user_id, None)
     try:
-        wishlist_item = WishlistItem.query.filter_by(user_id=user_id, product_index=product_id).first()
-        if wishlist_item:
-            # Item exists, so remove it from the wishlist
-            db.session.delete(wishlist_item)
+        deleted = db.session.execute(
+            delete(WishlistItem).where(WishlistItem.user_id == user_id, WishlistItem.product_index == product_id)).rowcount
+        if deleted:
             db.session.commit()
+            user_state_cache.set_wishlisted(user_id, product_id, False)
             print(f"INFO: Item removed from wishlist, {user_id=}, {product_id=}")
             return False, None
-            # Item does not exist, so add it to the wishlist
 
-        new_item = WishlistItem(user_id=user_id, product_index=product_id)
-        db.session.add(new_item)
-        db.session.commit()
-        print(f"INFO Item added to wishlist. {user_id=}, {product_id=}")
+        try:
+            db.session.add(WishlistItem(user_id=user_id, product_index=product_id))
+            db.session.commit()
+            print(f"INFO Item added to wishlist. {user_id=}, {product_id=}")
+        except IntegrityError:
+            db.session.rollback()
+            print(f"INFO Item already in wishlist. {user_id=}, {product_id=}")
+        user_state_cache.set_wishlisted(user_id, product_id, True)
         return True, None
     except Exception as e:
+        db.session.rollback()
         return False, e
     
 def complete_onboarding(age, gender):
@@ -211,13 +387,12 @@ def complete_onboarding(age, gender):
         return False
     
     try:
-        user = User.query.get(g.user_id)
-        user.gender = gender
-        user.birth_year = datetime.datetime.now().year - age
-        user.onboarding_stage = ONBOARDING_COMPLETE
-        
-        db.session.commit()
+        if not _update_user(g.user_id, gender=gender, birth_year=datetime.datetime.now().year - age,
+                            onboarding_stage=ONBOARDING_COMPLETE):
+            print(f"ERROR: Onboarding unknown user {g.user_id=}")
+            return False
     except Exception as e:
+        db.session.rollback()
         print('ERROR: Error commiting onboarding data to db: ', e)
         return False
     
@@ -226,4 +401,4 @@ def complete_onboarding(age, gender):
     return True
 
 def get_products_from_df(product_indices):
-    return products_df.iloc[product_indices].to_dict('records')
\ No newline at end of file
+    return artifacts['catalog'].get_rows(product_indices)
\ No newline at end of file
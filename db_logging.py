@@ -1,57 +1,82 @@
-from app import db
+import atexit
+from datetime import datetime
+import pytz
+from app import app, db
 from models import UserClick
 from flask import g, request
 from config import Config
+import feed
+from user_state import user_state_cache
+from batch_writer import BatchWriter
+from click_log import SegmentLog
 
 def is_bot():
-    user_agent = request.headers.get('User-Agent', '').lower()
-    for bot in Config.SCRAPING_BOTS:
-        if bot in user_agent:
-            return True
-    return False
+    # Set by bots.detect_bot before every request.
+    return g.get('is_bot', False)
 
-# TODO: Make this asynchronous. We don't care if we lose some of the clicks. 
-def log_product_click(product_id, referrer=None):
-    if is_bot():
-        return
-    user_click = UserClick(
+def _insert_user_clicks(rows):
+    # Runs on the writer thread, outside of any request.
+    with app.app_context():
+        try:
+            db.session.execute(UserClick.__table__.insert(), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+# LOGGING_DESTINATION=FILE appends clicks to local segment files, bulk loaded later by scripts/load_click_logs.py.
+user_click_log = SegmentLog(Config.LOGGING_FILE_DIR, max_bytes=Config.LOGGING_FILE_MAX_BYTES, max_seconds=Config.LOGGING_FILE_MAX_SECONDS)
+
+# With LOGGING_ASYNC (or FILE), writes happen in batches on a background thread instead of once per request.
+# With FILE, the thread also closes an idle worker's segment, so .open segments always belong to a live writer.
+_log_to_file = (Config.LOGGING_DESTINATION == 'FILE')
+user_click_writer = BatchWriter(user_click_log.write if _log_to_file else _insert_user_clicks,
+                                max_queue_size=Config.LOGGING_QUEUE_SIZE, max_batch_size=Config.LOGGING_BATCH_SIZE, 
+                                max_wait_ms=Config.LOGGING_BATCH_WAIT_MS,
+                                on_idle=user_click_log.close_expired if _log_to_file else None,
+                                idle_seconds=Config.LOGGING_FILE_MAX_SECONDS if _log_to_file else None)
+# atexit runs in reverse order : flush the queue, then close the segment.
+atexit.register(user_click_log.close)
+atexit.register(user_click_writer.flush)
+
+
+def _log_user_click(**fields):
+    row = dict(
         user_id=g.user_id, 
         session_id=g.session_id, 
-        referrer=referrer, 
-        product_index=product_id,
         ip=request.remote_addr,
-        user_agent=request.headers.get('User-Agent', '')
+        # A longer value would fail the whole batch insert.
+        user_agent=request.headers.get('User-Agent', '')[:255],
+        clicked_at=datetime.now(pytz.timezone('Asia/Kolkata')),
+        # Every row has the same keys, executemany compiles the insert from the first one.
+        product_index=None,
+        search_query=None,
     )
+    row.update(fields)
 
-    if Config.LOGGING_DESTINATION == 'DB':
+    if Config.LOGGING_DESTINATION == 'FILE' or (Config.LOGGING_DESTINATION == 'DB' and Config.LOGGING_ASYNC):
+        user_click_writer.put(row)
+    elif Config.LOGGING_DESTINATION == 'DB':
         try:
-            db.session.add(user_click)
+            db.session.add(UserClick(**row))
             db.session.commit()
         except Exception as e:
-            print(f"ERROR: Logging product click failed. {g.user_id=}, {product_id=}, {e=}")
+            db.session.rollback()
+            print(f"ERROR: Logging user click failed. {row=}, {e=}")
     elif Config.LOGGING_DESTINATION == 'LOG':
-        print(f"INFO: LOGGING {user_click=}")
-    else:
-        pass
+        print(f"INFO: LOGGING user_click={row}")
+
+
+def log_product_click(product_id, referrer=None):
+    if is_bot():
+        return
+    _log_user_click(product_index=product_id, referrer=referrer)
+    if g.user_id:
+        user_state_cache.record_click(g.user_id, product_id)
+        feed.record_click(g.user_id, product_id)
         
         
 def log_search(search_query, referrer=None):
     if is_bot():
         return
-
-    user_click = UserClick(
-        user_id=g.user_id, 
-        session_id=g.session_id, 
-        referrer=referrer, 
-        search_query=search_query,
-        ip=request.remote_addr,
-        user_agent=request.headers.get('User-Agent', '')
-    )
-    if Config.LOGGING_DESTINATION == 'DB':
-        try:
-            db.session.add(user_click)
-            db.session.commit()
-        except Exception as e:
-            print(f"ERROR: Logging product click failed. {g.user_id=}, {search_query=}, {e=}")
-    elif Config.LOGGING_DESTINATION == 'LOG':
-        print(f"INFO: LOGGING {user_click=}")
\ No newline at end of file
+    _log_user_click(search_query=search_query, referrer=referrer)
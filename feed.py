@@ -0,0 +1,131 @@
+import threading
+import cachetools
+import numpy as np
+from config import Config
+
+# Config.FEED_MODE values. NEIGHBORS unions the precomputed similar products of the recent clicks, TASTE_VECTOR 
+# searches the index once with the user's recency-weighted mean embedding.
+NEIGHBORS, TASTE_VECTOR = 'NEIGHBORS', 'TASTE_VECTOR'
+
+
+def sample_feed(clicked_products, similar_products_cache, num_products, exclude=(), recency_decay=None, rng=None):
+    """Samples up to num_products distinct products from the neighbors of the clicked products (most recent first).
+
+    A candidate's weight is the sum, over the neighbor lists it appears in, of recency_decay ** click_position
+    times 1 / log2(2 + neighbor_rank). Products in exclude (e.g. wishlisted ones) are skipped. Sampling without
+    replacement uses Gumbel top-k, and the result is ordered by the sampled keys, so heavier products come first.
+    """
+    recency_decay = Config.FEED_RECENCY_DECAY if recency_decay is None else recency_decay
+    rng = rng or np.random.default_rng()
+    clicked_products = np.asarray(clicked_products, dtype=np.int64)
+    clicked_products = clicked_products[(clicked_products >= 0) & (clicked_products < len(similar_products_cache))]
+    if len(clicked_products) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    neighbors = np.asarray(similar_products_cache[clicked_products]) # shape = [C, K]
+    recency_weights = recency_decay ** np.arange(len(clicked_products))
+    rank_weights = 1 / np.log2(np.arange(neighbors.shape[1]) + 2)
+    weights = (recency_weights[:, None] * rank_weights[None, :]).reshape(-1)
+
+    candidates, inverse = np.unique(neighbors.reshape(-1), return_inverse=True)
+    candidate_weights = np.bincount(inverse, weights=weights)
+    if len(exclude):
+        keep = ~np.isin(candidates, np.asarray(list(exclude), dtype=np.int64))
+        candidates, candidate_weights = candidates[keep], candidate_weights[keep]
+
+    return _weighted_sample(candidates, candidate_weights, num_products, rng)
+
+
+def _weighted_sample(candidates, weights, num_products, rng):
+    """Gumbel top-k, i.e. sampling without replacement proportionally to weights, ordered by the sampled keys."""
+    num_products = min(num_products, len(candidates))
+    if num_products == 0:
+        return np.zeros(0, dtype=np.int64)
+    keys = np.log(weights) + rng.gumbel(size=len(candidates))
+    top = np.argpartition(-keys, num_products - 1)[:num_products]
+    return candidates[top[np.argsort(-keys[top])]]
+
+
+def taste_vector(clicked_products, image_embeddings, recency_decay=None):
+    """Recency-weighted sum of the clicked products' embeddings (most recent first), float32 of shape [DIM]."""
+    recency_decay = Config.FEED_RECENCY_DECAY if recency_decay is None else recency_decay
+    clicked_products = np.asarray(clicked_products, dtype=np.int64)
+    clicked_products = clicked_products[(clicked_products >= 0) & (clicked_products < len(image_embeddings))]
+    weights = (recency_decay ** np.arange(len(clicked_products))).astype(np.float32)
+    return weights @ np.asarray(image_embeddings[clicked_products], dtype=np.float32)
+
+
+class TasteVectors:
+    """Per-user taste vectors, i.e. taste_vector() of the user's clicks, kept in memory by each worker.
+
+    A click only records the product. The next get() folds pending clicks in, as vector = decay * vector + embedding,
+    so updating costs one embedding row per new click instead of recomputing over the history.
+    """
+    def __init__(self, max_users, ttl, recency_decay=None):
+        self.recency_decay = Config.FEED_RECENCY_DECAY if recency_decay is None else recency_decay
+        self._users = cachetools.TTLCache(maxsize=max_users, ttl=ttl) # user_id -> [vector, pending clicks]
+        self._lock = threading.Lock()
+
+    def get(self, user_id, image_embeddings):
+        """Returns the user's taste vector, or None if the user isn't in memory."""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            vector, pending = entry
+            if pending:
+                # pending is oldest first, taste_vector expects most recent first.
+                vector = (self.recency_decay ** len(pending)) * vector + \
+                    taste_vector(pending[::-1], image_embeddings, recency_decay=self.recency_decay)
+                entry[:] = [vector, []]
+            return vector
+
+    def seed(self, user_id, vector):
+        with self._lock:
+            self._users[user_id] = [vector, []]
+
+    def add(self, user_id, product_index):
+        """Records a click for users already in memory. Others are seeded from their recent clicks when needed."""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                entry[1].append(product_index)
+
+
+taste_vectors = TasteVectors(max_users=Config.FEED_TASTE_VECTOR_USERS, ttl=Config.FEED_TASTE_VECTOR_TTL)
+
+
+def record_click(user_id, product_index):
+    taste_vectors.add(user_id, product_index)
+
+
+def _normalize(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def sample_taste_feed(click_vector, wishlisted_embeddings, faiss_index, num_products, exclude=(), wishlist_weight=None,
+                      num_candidates=None, rng=None):
+    """Samples up to num_products products from a single index search around the user's taste.
+
+    The query is normalize(normalize(click_vector) + wishlist_weight * normalize(mean of wishlisted_embeddings)).
+    The top num_candidates results (minus exclude) are sampled with weight 1 / log2(2 + rank), like sample_feed.
+    """
+    wishlist_weight = Config.FEED_WISHLIST_WEIGHT if wishlist_weight is None else wishlist_weight
+    num_candidates = num_candidates or num_products * Config.FEED_TASTE_CANDIDATES
+    rng = rng or np.random.default_rng()
+
+    query = _normalize(np.asarray(click_vector, dtype=np.float32))
+    if len(wishlisted_embeddings) and wishlist_weight:
+        query = query + wishlist_weight * _normalize(np.asarray(wishlisted_embeddings, dtype=np.float32).mean(axis=0))
+    query = _normalize(query).astype(np.float32).reshape(1, -1)
+
+    k = min(num_candidates + len(exclude), faiss_index.ntotal)
+    _, candidates = faiss_index.search(query, k)
+    candidates = candidates[0].astype(np.int64)
+    candidates = candidates[candidates >= 0]
+    if len(exclude):
+        candidates = candidates[~np.isin(candidates, np.asarray(list(exclude), dtype=np.int64))]
+    candidates = candidates[:num_candidates]
+    weights = 1 / np.log2(np.arange(len(candidates)) + 2)
+    return _weighted_sample(candidates, weights, num_products, rng)
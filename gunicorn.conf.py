@@ -0,0 +1,14 @@
+# Picked up automatically by gunicorn from the working directory.
+import gc
+import os
+
+# SHARED_ARTIFACTS : load all artifacts once in the master, then fork the workers, which share them.
+# See shared_artifacts.py and scripts/worker_memory_report.py. Read from the environment directly,
+# since the app (and config.py) isn't importable yet when gunicorn reads this file.
+preload_app = (os.environ.get('SHARED_ARTIFACTS', 'False').lower() == 'true')
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the garbage collector's reach, so collections in the
+    # workers don't write to (and un-share) the pages holding the preloaded objects.
+    if preload_app:
+        gc.freeze()
@@ -0,0 +1,54 @@
+import json
+import numpy as np
+
+
+def _dumps(value):
+    # Same output as flask's jsonify outside debug mode.
+    return json.dumps(value, separators=(',', ':'), sort_keys=True).encode()
+
+
+class Inspirations:
+    """Per-gender inspirations, prepared once at load time and never mutated afterwards.
+
+    Requests get shuffled copies (or pre-serialized JSON spliced in a shuffled order), and the default feed samples
+    from a numpy pool of the distinct inspiration product indexes.
+    """
+    def __init__(self, inspirations_obj):
+        self.inspirations, self.pools, self.fragments = {}, {}, {}
+        for gender, inspirations in inspirations_obj.items():
+            inspirations = tuple({**insp, 'products' : tuple(insp['products'])} for insp in inspirations)
+            self.inspirations[gender] = inspirations
+            self.pools[gender] = np.unique(np.array([product['index'] for insp in inspirations for product in insp['products']],
+                                                    dtype=np.int64))
+            # Per inspiration : the serialized object without products (ending in ',"products":['), and the products.
+            self.fragments[gender] = [
+                (_dumps({key : value for key, value in insp.items() if key != 'products'})[:-1] +
+                 (b',' if len(insp) > 1 else b'') + b'"products":[',
+                 [_dumps(product) for product in insp['products']])
+                for insp in inspirations]
+
+    def __contains__(self, gender):
+        return gender in self.inspirations
+
+    def shuffled(self, gender, rng=None):
+        """Inspirations and their products in random order, as new lists. The product dicts are shared, don't mutate them."""
+        rng = rng or np.random.default_rng()
+        inspirations = self.inspirations[gender]
+        return [{**inspirations[i], 'products' : [inspirations[i]['products'][j] for j in rng.permutation(len(inspirations[i]['products']))]}
+                for i in rng.permutation(len(inspirations))]
+
+    def shuffled_json(self, gender, rng=None):
+        """Same as shuffled(), serialized to a JSON array."""
+        rng = rng or np.random.default_rng()
+        fragments = self.fragments[gender]
+        parts = []
+        for i in rng.permutation(len(fragments)):
+            prefix, products = fragments[i]
+            parts.append(prefix + b','.join(products[j] for j in rng.permutation(len(products))) + b']}')
+        return b'[' + b','.join(parts) + b']'
+
+    def sample_products(self, gender, num_products, rng=None):
+        """Up to num_products distinct product indexes of the gender's inspirations, in random order."""
+        rng = rng or np.random.default_rng()
+        pool = self.pools[gender]
+        return rng.choice(pool, size=min(num_products, len(pool)), replace=False)
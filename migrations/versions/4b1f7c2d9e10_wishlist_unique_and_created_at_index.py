@@ -0,0 +1,37 @@
+"""wishlist_unique_and_created_at_index
+
+Revision ID: 4b1f7c2d9e10
+Revises: 693211396d20
+Create Date: 2024-11-20 18:12:41.273104
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b1f7c2d9e10'
+down_revision = '693211396d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the first row of each (user_id, product_index), duplicates came from racing toggles.
+    op.execute("""
+        DELETE FROM wishlist_item
+        WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id FROM wishlist_item GROUP BY user_id, product_index
+            ) AS first_items
+        )
+    """)
+    with op.batch_alter_table('wishlist_item', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_wishlist_item_user_id_product_index', ['user_id', 'product_index'])
+        batch_op.create_index('ix_wishlist_item_user_id_created_at', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('wishlist_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_wishlist_item_user_id_created_at')
+        batch_op.drop_constraint('uq_wishlist_item_user_id_product_index', type_='unique')
@@ -0,0 +1,51 @@
+"""user_click_index_and_daily_rollup
+
+Revision ID: 9c3e5a7b1d42
+Revises: 4b1f7c2d9e10
+Create Date: 2024-11-24 11:05:37.518209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5a7b1d42'
+down_revision = '4b1f7c2d9e10'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_user_click_user_id_clicked_at'
+
+
+def upgrade():
+    # Recent product clicks of a user : filtered on product_index IS NOT NULL (searches are skipped) and covering
+    # product_index, so the feed query is an index range scan.
+    if op.get_bind().dialect.name == 'sqlite':
+        # No INCLUDE on SQLite, cover product_index with a trailing key column.
+        op.create_index(INDEX_NAME, 'user_click', ['user_id', sa.text('clicked_at DESC'), 'product_index'], unique=False,
+                        sqlite_where=sa.text('product_index IS NOT NULL'))
+    else:
+        op.create_index(INDEX_NAME, 'user_click', ['user_id', sa.text('clicked_at DESC')], unique=False,
+                        mssql_include=['product_index'], mssql_where=sa.text('product_index IS NOT NULL'),
+                        postgresql_include=['product_index'], postgresql_where=sa.text('product_index IS NOT NULL'))
+
+    op.create_table('user_click_daily',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('product_index', sa.Integer(), nullable=True),
+        sa.Column('search_query', sa.String(), nullable=True),
+        sa.Column('clicks', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('user_click_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_user_click_daily_user_id_day', ['user_id', 'day'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_click_daily', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_click_daily_user_id_day')
+    op.drop_table('user_click_daily')
+    op.drop_index(INDEX_NAME, table_name='user_click')
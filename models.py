@@ -26,6 +26,11 @@ class User(db.Model, UserMixin):
         return f"{self.id=}\n{self.email=}\n{self.name=}"
 
 class WishlistItem(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_index', name='uq_wishlist_item_user_id_product_index'),
+        # Wishlist pages, most recent first.
+        db.Index('ix_wishlist_item_user_id_created_at', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True) # Add a primary key
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     product_index = db.Column(db.Integer, index=True)
@@ -41,4 +46,27 @@ class UserClick(db.Model):
     referrer = db.Column(db.String, nullable=True)
     clicked_at = db.Column(db.DateTime, nullable=True, default=lambda: datetime.now(pytz.timezone('Asia/Kolkata')))
     ip = db.Column(db.String(45), nullable=True)
-    user_agent = db.Column(db.String(255), nullable=True)
\ No newline at end of file
+    user_agent = db.Column(db.String(255), nullable=True)
+
+
+# Recent product clicks of a user (core.get_recent_clicked_products), without touching the table. Same as migration
+# 9c3e5a7b1d42 : SQLite has no INCLUDE, so product_index is a trailing key column there instead.
+db.Index('ix_user_click_user_id_clicked_at', UserClick.user_id, UserClick.clicked_at.desc(),
+         mssql_include=['product_index'], postgresql_include=['product_index'],
+         mssql_where=UserClick.product_index.isnot(None), postgresql_where=UserClick.product_index.isnot(None)
+         ).ddl_if(callable_=lambda ddl, target, bind, dialect, **kw: dialect.name != 'sqlite')
+db.Index('ix_user_click_user_id_clicked_at', UserClick.user_id, UserClick.clicked_at.desc(), UserClick.product_index,
+         sqlite_where=UserClick.product_index.isnot(None)).ddl_if(dialect='sqlite')
+
+
+class UserClickDaily(db.Model):
+    """Daily counts of clicks older than USER_CLICK_RETENTION_DAYS, rolled up by scripts/rollup_user_clicks.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    product_index = db.Column(db.Integer, nullable=True)
+    search_query = db.Column(db.String, nullable=True)
+    clicks = db.Column(db.Integer, nullable=False)
+    __table_args__ = (
+        db.Index('ix_user_click_daily_user_id_day', 'user_id', 'day'),
+    )
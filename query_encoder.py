@@ -0,0 +1,65 @@
+import os
+import re
+import numpy as np
+
+_SEPARATORS = re.compile(r'[\s\-]+')
+
+def normalize_query(query):
+    """Canonical form used as the cache key. 'Red-Dress ' and 'red  dress' share an embedding."""
+    return _SEPARATORS.sub(' ', query.lower()).strip()
+
+
+class QueryEncoder:
+    """Encodes search queries into normalized embeddings, memoizing them in an LRU cache."""
+    def __init__(self, model, tokenizer, cache):
+        self.model, self.tokenizer, self.cache = model, tokenizer, cache
+
+    def encode_batch(self, queries):
+        """Runs the text tower on a list of queries. Returns normalized float32 array of shape [len(queries), DIM]."""
+        # model is one of the text_encoders, which return numpy arrays.
+        embeddings = np.array(self.model.encode_text(self.tokenizer(queries)), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings
+
+    def encode(self, query):
+        """Returns the normalized embedding of shape [DIM] for the query."""
+        key = normalize_query(query)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = self.encode_batch([key])[0]
+            # Cached arrays are shared across requests.
+            embedding.setflags(write=False)
+            self.cache.set(key, embedding)
+        return embedding
+
+    def encode_many(self, queries):
+        """Returns normalized embeddings of shape [len(queries), DIM], running the text tower once for all cache misses."""
+        keys = [normalize_query(query) for query in queries]
+        embeddings = [self.cache.get(key) for key in keys]
+        missing_keys = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+        if missing_keys:
+            encoded = dict(zip(missing_keys, self.encode_batch(missing_keys)))
+            for key, embedding in encoded.items():
+                embedding.setflags(write=False)
+                self.cache.set(key, embedding)
+            embeddings = [encoded[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+        return np.stack(embeddings)
+
+    def load_warm_file(self, path):
+        """Populates the cache from an .npz file with `queries` and `embeddings` arrays. Returns the number of loaded queries."""
+        if not path or not os.path.exists(path):
+            return 0
+        warm = np.load(path)
+        queries, embeddings = warm['queries'], warm['embeddings'].astype(np.float32)
+        embeddings.setflags(write=False)
+        for query, embedding in zip(queries.tolist(), embeddings):
+            self.cache.set(normalize_query(query), embedding)
+        return len(queries)
+
+    def save_warm_file(self, path):
+        """Dumps the current cache contents, so they can be loaded at the next startup."""
+        items = self.cache.items()
+        queries = np.array([query for query, _ in items], dtype=str)
+        embeddings = np.stack([embedding for _, embedding in items]) if items else np.zeros((0, 0), dtype=np.float32)
+        np.savez(path, queries=queries, embeddings=embeddings)
+        return len(items)
@@ -0,0 +1,64 @@
+"""Compares the old linear substring scan with bots.BotDetector on realistic User-Agent strings.
+
+Usage (from the repo root):
+    python -m scripts.benchmark_bot_detection [--num_calls 200000]
+"""
+import argparse
+import time
+import numpy as np
+from bots import BotDetector
+from config import Config
+
+USER_AGENTS = [
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.6478.122 Mobile Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Safari/605.1.15',
+    'Mozilla/5.0 (Linux; Android 13; Redmi Note 12) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.6422.165 Mobile Safari/537.36 Instagram 337.0.0.35.102',
+    'Husn/1.4 CFNetwork/1496.0.7 Darwin/23.5.0',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    'Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)',
+    'Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)',
+    'Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; GPTBot/1.2; +https://openai.com/gptbot)',
+]
+
+
+def old_is_bot(user_agent):
+    user_agent = user_agent.lower()
+    for bot in Config.SCRAPING_BOTS:
+        if bot in user_agent:
+            return True
+    return False
+
+
+def time_ns(func, user_agents):
+    start_time = time.perf_counter_ns()
+    for user_agent in user_agents:
+        func(user_agent)
+    return (time.perf_counter_ns() - start_time) / len(user_agents)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_calls', type=int, default=200000)
+    parser.add_argument('--num_patterns', type=int, default=None, help="Pad SCRAPING_BOTS with dummy patterns up to this many.")
+    args = parser.parse_args()
+
+    if args.num_patterns:
+        Config.SCRAPING_BOTS = Config.SCRAPING_BOTS + [f'dummybot{i}' for i in range(args.num_patterns - len(Config.SCRAPING_BOTS))]
+    # Mostly browsers, like production traffic.
+    rng = np.random.default_rng(0)
+    user_agents = [USER_AGENTS[i] for i in rng.choice(len(USER_AGENTS), size=args.num_calls, p=[0.25, 0.25, 0.1, 0.1, 0.1, 0.1, 0.04, 0.02, 0.02, 0.02])]
+
+    detector = BotDetector(Config.SCRAPING_BOTS)
+    for user_agent in USER_AGENTS:
+        assert detector.is_bot(user_agent) == old_is_bot(user_agent), user_agent
+
+    print(f"{len(Config.SCRAPING_BOTS)} patterns, {args.num_calls} calls")
+    print(f"linear scan   : {time_ns(old_is_bot, user_agents):8.0f} ns/call")
+    print(f"regex         : {time_ns(detector._match, user_agents):8.0f} ns/call")
+    print(f"regex + memo  : {time_ns(detector.is_bot, user_agents):8.0f} ns/call")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Compares DataFrame.iloc[indices].to_dict('records') with Catalog.get_rows for listing sized batches.
+
+Usage (from the repo root, after scripts/build_catalog.py):
+    python -m scripts.benchmark_catalog
+"""
+import argparse
+import time
+import numpy as np
+import artifacts_loader
+from catalog import Catalog, PRODUCT_COLUMNS
+
+
+def time_ms(func, batches):
+    latencies = []
+    for indices in batches:
+        start_time = time.perf_counter()
+        func(indices)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[128, 256])
+    parser.add_argument('--num_batches', type=int, default=500)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    products_df = artifacts_loader.load_products_df()
+    print(f"pd.read_csv: {time.perf_counter() - start_time:.2f}s")
+    start_time = time.perf_counter()
+    catalog = Catalog.load(artifacts_loader.get_catalog_dir())
+    print(f"Catalog.load: {time.perf_counter() - start_time:.4f}s")
+
+    rng = np.random.default_rng(0)
+    for batch_size in args.batch_sizes:
+        batches = [rng.choice(len(catalog), batch_size, replace=False) for _ in range(args.num_batches)]
+        for name, func in [
+            ("DataFrame (all columns)", lambda indices: products_df.iloc[indices].to_dict('records')),
+            ("DataFrame (product columns)", lambda indices: products_df.iloc[indices][list(PRODUCT_COLUMNS)].to_dict('records')),
+            ("Catalog.get_rows", catalog.get_rows),
+        ]:
+            p50, p99 = time_ms(func, batches)
+            print(f"{batch_size:>4} rows | {name:<28} p50={p50:7.3f}ms  p99={p99:7.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Per-request overhead of the bot detection and cookie hooks (before_request + after_request), before and after
+caching verified auth_info cookies and skipping session cookies for crawlers.
+
+Usage (from the repo root):
+    python -m scripts.benchmark_cookie_hooks [--num_requests 20000]
+"""
+import argparse
+import time
+from flask import Flask, g, request
+from config import Config
+
+Config.SECRET_KEY = Config.SECRET_KEY or 'benchmark-secret-key'
+import bots
+import cookie_handler
+from caches import StatsCache
+
+BROWSER = 'Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.6478.122 Mobile Safari/537.36'
+CRAWLER = 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
+
+
+def old_get_auth_info():
+    """get_auth_info before the cache : verifies the cookie on every request, signs sessions for crawlers too."""
+    g.cookie_updates = {}
+    g.user_id, g.session_id = None, None
+    auth_cookie = request.cookies.get('auth_info')
+    if not auth_cookie:
+        cookie_handler.set_cookie_updates_for_new_session()
+        return
+    payload = cookie_handler.serializer.loads(auth_cookie, max_age=Config.MAX_COOKIE_AGE)
+    g.user_id, g.session_id = payload.get('user_id'), payload.get('session_id')
+    for key in ['picture_url', 'gender', 'onboarding_stage', 'email']:
+        setattr(g, key, request.cookies.get(key))
+
+
+def time_us(app, get_auth_info, num_requests, user_agent, cookies):
+    """Mean microseconds per request of the hooks, with the request context already pushed for each request."""
+    headers = {'User-Agent' : user_agent}
+    if cookies:
+        headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in cookies.items())
+    total = 0
+    for _ in range(num_requests):
+        with app.test_request_context('/', headers=headers):
+            response = app.response_class('')
+            start_time = time.perf_counter_ns()
+            bots.detect_bot()
+            get_auth_info()
+            cookie_handler.update_cookies(response)
+            total += time.perf_counter_ns() - start_time
+    return total / num_requests / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    cookie_handler.verified_cookies = StatsCache(maxsize=Config.AUTH_COOKIE_CACHE_SIZE or 10000, ttl=Config.AUTH_COOKIE_CACHE_TTL)
+    logged_in = {'auth_info' : cookie_handler.serializer.dumps({'user_id' : 42, 'session_id' : 'f3c1d6a2-benchmark'}),
+                 'gender' : 'WOMAN', 'onboarding_stage' : 'COMPLETE', 'email' : 'user@example.com', 'picture_url' : ''}
+    cases = [('logged in browser', BROWSER, logged_in), ('new browser', BROWSER, {}), ('crawler', CRAWLER, {})]
+
+    print(f"{args.num_requests} requests per case, us/request")
+    print(f"{'':20s} {'before':>8s} {'after':>8s}")
+    for name, user_agent, cookies in cases:
+        before = time_us(app, old_get_auth_info, args.num_requests, user_agent, cookies)
+        after = time_us(app, cookie_handler.get_auth_info, args.num_requests, user_agent, cookies)
+        print(f"{name:20s} {before:8.1f} {after:8.1f}")
+    print(f"verified_cookies : {cookie_handler.verified_cookies.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Compares p50 / p99 latency of the old and new core.get_feed sampling paths, on a synthetic click log in SQLite.
+
+before : user_click query + np.unique + random.sample (the previous get_feed).
+cold   : user_click query + wishlist query + feed.sample_feed (user not in the user state cache).
+hot    : feed.sample_feed, recent clicks and wishlist served from the user state cache (LOCAL backend).
+
+Usage (from the repo root):
+    python -m scripts.benchmark_feed --num_users 10000 --clicks_per_user 50
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+import numpy as np
+from flask import Flask
+from db import db
+from models import UserClick, WishlistItem
+import feed
+from user_state import LocalBackend, UserStateCache
+
+
+def percentiles_ms(func, user_ids):
+    latencies = []
+    for user_id in user_ids:
+        start_time = time.perf_counter()
+        func(user_id)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def seed_database(num_users, clicks_per_user, wishlist_per_user, num_products, rng):
+    now = datetime.datetime(2024, 1, 1)
+    clicks, wishlist = [], []
+    for user_id in range(1, num_users + 1):
+        for i, product_index in enumerate(rng.integers(0, num_products, size=clicks_per_user).tolist()):
+            clicks.append({'user_id' : user_id, 'session_id' : str(user_id), 'product_index' : product_index,
+                           'clicked_at' : now + datetime.timedelta(seconds=i)})
+        for product_index in rng.choice(num_products, size=wishlist_per_user, replace=False).tolist():
+            wishlist.append({'user_id' : user_id, 'product_index' : product_index})
+    db.session.execute(UserClick.__table__.insert(), clicks)
+    db.session.execute(WishlistItem.__table__.insert(), wishlist)
+    db.session.commit()
+
+
+def query_clicked_products(user_id, limit):
+    clicks = UserClick.query.with_entities(UserClick.product_index, UserClick.clicked_at) \
+        .filter_by(user_id=user_id) \
+        .filter(UserClick.product_index.isnot(None)) \
+        .order_by(UserClick.clicked_at.desc()) \
+        .limit(limit) \
+        .all()
+    return list(dict.fromkeys(click.product_index for click in clicks))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_users', type=int, default=10000)
+    parser.add_argument('--clicks_per_user', type=int, default=50)
+    parser.add_argument('--wishlist_per_user', type=int, default=10)
+    parser.add_argument('--num_products', type=int, default=200000)
+    parser.add_argument('--num_neighbors', type=int, default=256)
+    parser.add_argument('--click_sample', type=int, default=32)
+    parser.add_argument('--num_products_per_feed', type=int, default=256)
+    parser.add_argument('--num_requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    similar_products_cache = rng.integers(0, args.num_products, size=(args.num_products, args.num_neighbors), dtype=np.int32)
+    user_ids = rng.integers(1, args.num_users + 1, size=args.num_requests).tolist()
+    user_state_cache = UserStateCache(LocalBackend(max_keys=8 * args.num_users, ttl=3600), max_clicks=args.click_sample)
+
+    def before(user_id):
+        clicked_products = query_clicked_products(user_id, args.click_sample)
+        feed_products_indexes = np.unique(similar_products_cache[clicked_products]).tolist()
+        return random.sample(feed_products_indexes, min(args.num_products_per_feed, len(feed_products_indexes)))
+
+    def after(user_id):
+        clicked_products = user_state_cache.get_recent_clicks(user_id, lambda: query_clicked_products(user_id, args.click_sample))
+        wishlisted_products = user_state_cache.get_wishlist(
+            user_id, lambda: [product[0] for product in db.session.query(WishlistItem.product_index).filter_by(user_id=user_id).all()])
+        return feed.sample_feed(clicked_products, similar_products_cache, args.num_products_per_feed, exclude=wishlisted_products)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            start_time = time.perf_counter()
+            seed_database(args.num_users, args.clicks_per_user, args.wishlist_per_user, args.num_products, rng)
+            print(f"Seeded {args.num_users * args.clicks_per_user} clicks in {time.perf_counter() - start_time:.1f}s")
+
+            print(f"{'path':>8} {'p50_ms':>8} {'p99_ms':>8}")
+            for name, func in (('before', before), ('cold', after), ('hot', after)):
+                p50, p99 = percentiles_ms(func, user_ids)
+                print(f"{name:>8} {p50:8.2f} {p99:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""Converts products_minimal.csv into the memory-mapped columnar catalog read by artifacts_loader.load_catalog,
+including the pre-serialized product json used by Config.PRODUCT_JSON_ROUTES.
+
+Usage (from the repo root):
+    python -m scripts.build_catalog
+"""
+import argparse
+import artifacts_loader
+from catalog import Catalog
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default=None, help='Defaults to DATA_ROOT_DIR/catalog.')
+    args = parser.parse_args()
+
+    output = args.output or artifacts_loader.get_catalog_dir()
+    catalog = Catalog.from_dataframe(artifacts_loader.load_products_df())
+    catalog.build_product_json()
+    catalog.save(output)
+    print(f"INFO: Wrote {len(catalog)} products to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Trains and serializes a FAISS index over the catalog image embeddings into DATA_ROOT_DIR.
+
+Usage (from the repo root):
+    FAISS_NLIST=4096 python -m scripts.build_faiss_index --index_type IVF_FLAT
+The server picks it up with FAISS_INDEX_TYPE=IVF_FLAT. Building FLAT as well lets workers mmap the
+flat index instead of rebuilding it from the embeddings at every start.
+"""
+import argparse
+import os
+import time
+import faiss
+import numpy as np
+import artifacts_loader
+import search_index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--index_type', required=True, choices=search_index.INDEX_TYPES)
+    parser.add_argument('--train_size', type=int, default=262144, help='Number of embeddings used to train IVF quantizers.')
+    parser.add_argument('--output', default=None, help='Defaults to search_index.get_index_path(index_type).')
+    parser.add_argument('--export_embeddings', action='store_true',
+                        help='Also write the normalized embeddings as .npy, which workers memory-map instead of torch.load-ing the .pt file.')
+    parser.add_argument('--embeddings_dtype', default='float32', choices=search_index.EMBEDDINGS_DTYPES,
+                        help='dtype of the exported embeddings, served with EMBEDDINGS_DTYPE.')
+    args = parser.parse_args()
+
+    image_embeddings = artifacts_loader.load_image_embeddings()
+    if args.export_embeddings:
+        embeddings_path = search_index.get_embeddings_path(args.embeddings_dtype)
+        # image_embeddings may be memory-mapped from embeddings_path itself, and workers map it too : writing it in
+        # place would truncate the pages being read. np.save appends .npy to names that don't end with it.
+        tmp_path = embeddings_path[: -len('.npy')] + '.tmp.npy'
+        np.save(tmp_path, np.ascontiguousarray(image_embeddings, dtype=args.embeddings_dtype))
+        os.replace(tmp_path, embeddings_path)
+        print(f"INFO: Wrote {embeddings_path}")
+    start_time = time.time()
+    index = search_index.build_index(image_embeddings, args.index_type, train_size=args.train_size)
+    print(f"INFO: Built {search_index.get_factory_string(args.index_type)} over {index.ntotal} embeddings in {time.time() - start_time:.1f}s")
+
+    output = args.output or search_index.get_index_path(args.index_type)
+    # Also replaced atomically, workers may have the previous index memory-mapped.
+    faiss.write_index(index, output + '.tmp')
+    os.replace(output + '.tmp', output)
+    print(f"INFO: Wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""Encodes a list of queries and writes the query embedding warm file loaded at startup.
+
+Usage (from the repo root):
+    python -m scripts.build_query_warm_file --queries top_queries.txt --output query_embeddings_warm.npz
+Then set QUERY_EMBEDDING_WARM_PATH to the output file.
+"""
+import argparse
+import numpy as np
+import artifacts_loader
+from query_encoder import QueryEncoder, normalize_query
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', required=True, help='Text file with one query per line.')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--batch_size', type=int, default=256)
+    args = parser.parse_args()
+
+    with open(args.queries) as f:
+        queries = list(dict.fromkeys(normalize_query(line) for line in f if line.strip()))
+
+    model, tokenizer = artifacts_loader.load_model_and_tokenizer()
+    query_encoder = QueryEncoder(model, tokenizer, cache=None)
+    embeddings = np.concatenate([query_encoder.encode_batch(queries[i : i + args.batch_size])
+                                 for i in range(0, len(queries), args.batch_size)])
+    np.savez(args.output, queries=np.array(queries, dtype=str), embeddings=embeddings)
+    print(f"INFO: Wrote {len(queries)} query embeddings to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Builds the similar products table (top-K neighbors of every product) with batched faiss searches
+across a process pool, checkpointing each batch so an interrupted run resumes where it stopped.
+
+Usage (from the repo root):
+    python -m scripts.build_similar_products --workers 8                       # full catalog
+    python -m scripts.build_similar_products --start_row 1300000               # only products appended to the catalog
+    python -m scripts.build_similar_products --rows changed_product_ids.txt    # only changed products
+
+Incremental runs update the given rows of the existing table in place. Existing rows aren't revisited,
+so new products only show up as neighbors of old ones after a full rebuild.
+"""
+import argparse
+import hashlib
+import os
+import time
+import multiprocessing
+import faiss
+import numpy as np
+import artifacts_loader
+import search_index
+from config import Config
+
+# Set in the parent before forking the pool, so workers share the index and embeddings pages.
+_image_embeddings, _faiss_index = None, None
+
+
+def exact_neighbors(rows, k, chunk_size=65536):
+    """Exact top-k neighbors (inner product) of the rows, scanning the embeddings chunk by chunk."""
+    queries = np.ascontiguousarray(_image_embeddings[rows], dtype=np.float32)
+    best_scores = np.zeros((len(rows), 0), dtype=np.float32)
+    best_ids = np.zeros((len(rows), 0), dtype=np.int64)
+    for start in range(0, len(_image_embeddings), chunk_size):
+        chunk = np.asarray(_image_embeddings[start : start + chunk_size], dtype=np.float32)
+        scores = np.concatenate([best_scores, queries @ chunk.T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + len(chunk)), (len(rows), len(chunk)))], axis=1)
+        top = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        best_scores, best_ids = np.take_along_axis(scores, top, axis=1), np.take_along_axis(ids, top, axis=1)
+    return best_ids
+
+
+def search_batch(args):
+    start, rows, k, exclude_self, checkpoint_path = args
+    _, neighbors = _faiss_index.search(np.ascontiguousarray(_image_embeddings[rows], dtype=np.float32), k + 1)
+    # Approximate indexes (IVF, HNSW) return -1 when they find fewer than k + 1 neighbors, served as the last product.
+    # Those rows are searched exactly instead.
+    missing = (neighbors < 0).any(axis=1)
+    if missing.any():
+        neighbors[missing] = exact_neighbors(rows[missing], k + 1)
+    if exclude_self:
+        # Drop the product itself, or the last neighbor if the product wasn't returned.
+        keep = neighbors != rows[:, None]
+        keep[keep.all(axis=1), -1] = False
+        neighbors = neighbors[keep].reshape(len(rows), k)
+    else:
+        neighbors = neighbors[:, :k]
+    # Written under a temporary name, so a batch interrupted mid-write is recomputed on resume.
+    np.save(checkpoint_path + '.tmp.npy', neighbors.astype(np.int32))
+    os.replace(checkpoint_path + '.tmp.npy', checkpoint_path)
+    return start, len(rows)
+
+
+def input_files_identity():
+    """(path, size, mtime) of the embeddings and index files the loaders may read, which change when they're rebuilt."""
+    paths = [search_index.get_embeddings_path(Config.EMBEDDINGS_DTYPE),
+             os.path.join(Config.DATA_ROOT_DIR, 'image_embeddings_normalized.pt'),
+             search_index.get_index_path(Config.FAISS_INDEX_TYPE),
+             search_index.get_index_path(search_index.FLAT)]
+    return [(path, os.path.getsize(path), os.path.getmtime(path)) for path in paths if os.path.exists(path)]
+
+
+def main():
+    global _image_embeddings, _faiss_index
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--k', type=int, default=None, help='Neighbors per product. Defaults to the existing table width, else 256.')
+    parser.add_argument('--batch_size', type=int, default=4096, help='Products per faiss search call (and per checkpoint).')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--checkpoint_dir', default='similar_products_checkpoints')
+    parser.add_argument('--start_row', type=int, default=None, help='Only compute rows >= start_row, e.g. newly added products.')
+    parser.add_argument('--rows', default=None, help='Text file with one product index per line to recompute.')
+    parser.add_argument('--exclude_self', action='store_true', help="Don't list a product as its own neighbor.")
+    args = parser.parse_args()
+
+    output_path = artifacts_loader.get_similar_products_cache_path()
+    existing = np.load(output_path, mmap_mode='r') if os.path.exists(output_path) else None
+    k = args.k or (existing.shape[1] if existing is not None else 256)
+
+    _image_embeddings = artifacts_loader.load_image_embeddings()
+    _faiss_index = artifacts_loader.load_faiss_index(_image_embeddings)
+    num_products = len(_image_embeddings)
+
+    if args.rows:
+        with open(args.rows) as f:
+            rows = np.unique(np.array([int(line) for line in f if line.strip()], dtype=np.int64))
+        rows = rows[rows < num_products]
+    elif args.start_row is not None:
+        rows = np.arange(args.start_row, num_products)
+    else:
+        rows = np.arange(num_products)
+    incremental = (args.rows or args.start_row is not None)
+    assert not incremental or existing is not None, f"Incremental runs need an existing {output_path}"
+    assert k < num_products, f"{k=} needs more than {num_products} products"
+    if incremental and len(existing) < num_products:
+        # Products appended since the existing table was built have no row in it yet, compute them as well.
+        missing_rows = np.setdiff1d(np.arange(len(existing), num_products), rows)
+        if len(missing_rows):
+            print(f"INFO: Also computing {len(missing_rows)} products missing from {output_path}")
+            rows = np.union1d(rows, missing_rows)
+    assert existing is None or not incremental or existing.shape[1] == k, f"{k=} doesn't match the existing table {existing.shape}"
+
+    # Checkpoints of a run are only valid for the same rows, parameters, embeddings and index.
+    run_key = f'{args.batch_size},{k},{args.exclude_self},{Config.FAISS_NPROBE},{Config.FAISS_EF_SEARCH},{input_files_identity()}'
+    run_id = hashlib.md5(rows.tobytes() + run_key.encode()).hexdigest()[:12]
+    checkpoint_dir = os.path.join(args.checkpoint_dir, run_id)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    tasks = []
+    for start in range(0, len(rows), args.batch_size):
+        checkpoint_path = os.path.join(checkpoint_dir, f'batch_{start:010d}.npy')
+        if not os.path.exists(checkpoint_path):
+            tasks.append((start, rows[start : start + args.batch_size], k, args.exclude_self, checkpoint_path))
+    print(f"INFO: {len(rows)} products, {len(tasks)} of {-(-len(rows) // args.batch_size)} batches left, {args.workers} workers")
+
+    start_time, done = time.time(), 0
+    if args.workers > 1:
+        # One faiss thread per process, the pool provides the parallelism.
+        faiss.omp_set_num_threads(1)
+        with multiprocessing.get_context('fork').Pool(args.workers) as pool:
+            for _, batch_size in pool.imap_unordered(search_batch, tasks):
+                done += batch_size
+                elapsed = time.time() - start_time
+                print(f"INFO: {done} products in {elapsed:.0f}s, {done / elapsed:.0f} products/sec", end='\r')
+    else:
+        for task in tasks:
+            done += search_batch(task)[1]
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"\nINFO: Computed {done} products in {elapsed:.1f}s, {done / elapsed:.0f} products/sec")
+
+    # Assemble the table from the checkpoints.
+    if incremental:
+        table = np.zeros((num_products, k), dtype=np.int32)
+        table[: len(existing)] = existing[: num_products]
+    else:
+        table = np.empty((num_products, k), dtype=np.int32)
+    for start in range(0, len(rows), args.batch_size):
+        checkpoint_path = os.path.join(checkpoint_dir, f'batch_{start:010d}.npy')
+        table[rows[start : start + args.batch_size]] = np.load(checkpoint_path)
+    del existing
+
+    # np.save appends .npy to names that don't end with it.
+    tmp_path = output_path[: -len('.npy')] + '.tmp.npy'
+    np.save(tmp_path, table)
+    os.replace(tmp_path, output_path)
+    print(f"INFO: Wrote {output_path} {table.shape}. Checkpoints in {checkpoint_dir} can be removed.")
+
+
+if __name__ == '__main__':
+    main()
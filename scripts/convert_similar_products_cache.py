@@ -0,0 +1,54 @@
+"""Converts similar_products_cache.pt (int64 torch tensor) into the int32 .npy table that workers memory-map,
+and compares memory and latency of the get_similar_products / get_feed lookups on both.
+
+Usage (from the repo root):
+    python -m scripts.convert_similar_products_cache
+
+Rows are kept in rank order, so they aren't delta-encoded : deltas between unsorted neighbor ids are as
+wide as the ids themselves and wouldn't fit a smaller dtype.
+"""
+import argparse
+import os
+import time
+import numpy as np
+import torch
+import artifacts_loader
+from config import Config
+
+
+def time_ms(func, repeats):
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start_time) * 1000 / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, default=128, help='Neighbors returned by get_similar_products.')
+    parser.add_argument('--feed_clicks', type=int, default=Config.FEED_CLICK_SAMPLE)
+    parser.add_argument('--repeats', type=int, default=2000)
+    args = parser.parse_args()
+
+    tensor = torch.load(os.path.join(Config.DATA_ROOT_DIR, 'similar_products_cache.pt'), weights_only=True)
+    assert tensor.max().item() < np.iinfo(np.int32).max and tensor.min().item() >= 0, "Indices don't fit int32"
+    np.save(artifacts_loader.get_similar_products_cache_path(), tensor.numpy().astype(np.int32))
+    table = np.load(artifacts_loader.get_similar_products_cache_path(), mmap_mode='r')
+    assert np.array_equal(table, tensor.numpy())
+    print(f"INFO: Wrote {artifacts_loader.get_similar_products_cache_path()} {table.shape}")
+    print(f"Memory: torch int64 {tensor.numel() * tensor.element_size() / 2**20:.1f}MB, numpy int32 {table.nbytes / 2**20:.1f}MB")
+
+    rng = np.random.default_rng(0)
+    product_id = int(rng.integers(len(table)))
+    clicked = rng.choice(len(table), args.feed_clicks, replace=False)
+    clicked_list = clicked.tolist()
+    comparisons = [
+        ('get_similar_products', lambda: tensor[product_id][:args.n].tolist(), lambda: table[product_id][:args.n].tolist()),
+        ('get_feed', lambda: list(set(tensor[clicked_list].view(-1).detach().tolist())), lambda: np.unique(table[clicked]).tolist()),
+    ]
+    for name, torch_func, numpy_func in comparisons:
+        print(f"{name:<22} torch {time_ms(torch_func, args.repeats):8.4f}ms  numpy {time_ms(numpy_func, args.repeats):8.4f}ms")
+
+
+if __name__ == '__main__':
+    main()
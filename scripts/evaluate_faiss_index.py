@@ -0,0 +1,73 @@
+"""Reports recall@k and search latency of serialized FAISS indexes against the exact flat index.
+
+Queries are random catalog embeddings (similar-products traffic) and, with --queries, encoded
+text queries (search traffic). Usage (from the repo root):
+    python -m scripts.evaluate_faiss_index --index_types IVF_FLAT HNSW IVF_PQ SQ_FP16 SQ8 --nprobe 16 32 64 128 --ef_search 128 256 512
+"""
+import argparse
+import time
+import faiss
+import numpy as np
+import artifacts_loader
+import search_index
+from query_encoder import QueryEncoder
+
+
+def recall_at_k(ground_truth, results):
+    return np.mean([len(np.intersect1d(truth, result)) / len(truth) for truth, result in zip(ground_truth, results)])
+
+def time_search(index, queries, k):
+    """Returns the results and the per-query latencies in ms, searching one query at a time like the server does."""
+    results, latencies = [], []
+    for query in queries:
+        start_time = time.perf_counter()
+        _, indices = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        results.append(indices[0])
+    return np.stack(results), np.array(latencies)
+
+def print_row(name, recall, latencies):
+    print(f"{name:<32} recall={recall:.4f}  p50={np.percentile(latencies, 50):8.3f}ms  p99={np.percentile(latencies, 99):8.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--index_types', nargs='+', default=list(search_index.INDEX_TYPES[1:]), choices=search_index.INDEX_TYPES)
+    parser.add_argument('--k', type=int, default=128)
+    parser.add_argument('--num_queries', type=int, default=500)
+    parser.add_argument('--queries', default=None, help='Optional text file with one search query per line.')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[16, 32, 64, 128])
+    parser.add_argument('--ef_search', type=int, nargs='+', default=[128, 256, 512])
+    args = parser.parse_args()
+
+    image_embeddings = artifacts_loader.load_image_embeddings()
+    rows = np.random.default_rng(0).choice(len(image_embeddings), args.num_queries, replace=False)
+    queries = np.asarray(image_embeddings[rows], dtype=np.float32)
+    if args.queries:
+        model, tokenizer = artifacts_loader.load_model_and_tokenizer()
+        with open(args.queries) as f:
+            text_queries = [line.strip() for line in f if line.strip()]
+        query_encoder = QueryEncoder(model, tokenizer, cache=None)
+        queries = np.concatenate([queries, query_encoder.encode_batch(text_queries)])
+
+    flat_index = search_index.build_index(image_embeddings, search_index.FLAT)
+    ground_truth, flat_latencies = time_search(flat_index, queries, args.k)
+    print_row('FLAT', 1.0, flat_latencies)
+    del flat_index
+
+    for index_type in args.index_types:
+        index = faiss.read_index(search_index.get_index_path(index_type))
+        if index_type in search_index.IVF_INDEX_TYPES:
+            sweep = [('nprobe', nprobe, dict(nprobe=nprobe)) for nprobe in args.nprobe]
+        elif index_type == search_index.HNSW:
+            sweep = [('efSearch', ef_search, dict(ef_search=ef_search)) for ef_search in args.ef_search]
+        else:
+            sweep = [('', '', {})]
+        for param_name, param_value, params in sweep:
+            search_index.set_search_params(index, index_type, **params)
+            results, latencies = time_search(index, queries, args.k)
+            print_row(f"{index_type} {param_name}={param_value}", recall_at_k(ground_truth, results), latencies)
+
+
+if __name__ == '__main__':
+    main()
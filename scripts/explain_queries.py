@@ -0,0 +1,110 @@
+"""Prints SQLite EXPLAIN QUERY PLAN output for the ORM queries in core.py, against a seeded local database.
+
+The database is created from models.py (including the indexes added by the migrations) and seeded with
+--num_users x --clicks_per_user user_click rows, then reused by later runs. Look for SCAN (full table scans) and
+USE TEMP B-TREE (sorts) in the plans.
+
+Usage (from the repo root):
+    python -m scripts.explain_queries --db explain.db --num_users 50000 --clicks_per_user 60
+"""
+import argparse
+import datetime
+import os
+import time
+import numpy as np
+import sqlalchemy as sa
+from flask import Flask
+from db import db
+from models import User, UserClick, WishlistItem
+
+
+def seed(num_users, clicks_per_user, wishlist_per_user, num_products, rng):
+    connection = db.engine.raw_connection()
+    cursor = connection.cursor()
+    now = datetime.datetime(2024, 11, 1)
+    cursor.executemany("INSERT INTO user (id, email, sub) VALUES (?, ?, ?)",
+                       [(user_id, f'user{user_id}@example.com', f'sub{user_id}') for user_id in range(1, num_users + 1)])
+    for start in range(1, num_users + 1, 1000):
+        rows = []
+        for user_id in range(start, min(start + 1000, num_users + 1)):
+            products = rng.integers(0, num_products, size=clicks_per_user).tolist()
+            searches = rng.random(clicks_per_user) < 0.2
+            for product_index, is_search in zip(products, searches):
+                clicked_at = (now - datetime.timedelta(minutes=int(rng.integers(0, 500000)))).isoformat(sep=' ')
+                rows.append((user_id, str(user_id), None if is_search else product_index, 'red dress' if is_search else None, clicked_at))
+        cursor.executemany("INSERT INTO user_click (user_id, session_id, product_index, search_query, clicked_at) VALUES (?, ?, ?, ?, ?)", rows)
+        wishlist = {(user_id, product_index) for user_id in range(start, min(start + 1000, num_users + 1))
+                    for product_index in rng.integers(0, num_products, size=wishlist_per_user).tolist()}
+        cursor.executemany("INSERT INTO wishlist_item (user_id, product_index, created_at) VALUES (?, ?, ?)",
+                           [(user_id, product_index, now.isoformat(sep=' ')) for user_id, product_index in wishlist])
+    connection.commit()
+    cursor.execute("ANALYZE")
+    connection.close()
+
+
+def create_migration_indexes():
+    # SQLite variant of the user_click index in migrations/versions/9c3e5a7b1d42 (covering via a trailing key column).
+    db.session.execute(sa.text("DROP INDEX IF EXISTS ix_user_click_user_id_clicked_at"))
+    db.session.execute(sa.text("CREATE INDEX ix_user_click_user_id_clicked_at ON user_click "
+                               "(user_id, clicked_at DESC, product_index) WHERE product_index IS NOT NULL"))
+    db.session.commit()
+
+
+def core_queries(user_id, product_index, limit):
+    """The queries of core.py, built the same way, as (name, statement)."""
+    created_at = datetime.datetime(2024, 10, 1)
+    return [
+        ('get_recent_clicked_products (feed)', UserClick.query.with_entities(UserClick.product_index, UserClick.clicked_at)
+            .filter_by(user_id=user_id).filter(UserClick.product_index.isnot(None))
+            .order_by(UserClick.clicked_at.desc()).limit(limit).statement),
+        ('get_wishlist_indexes', db.session.query(WishlistItem.product_index).filter_by(user_id=user_id)
+            .order_by(WishlistItem.created_at.desc()).statement),
+        ('get_wishlisted_products_page', db.session.query(WishlistItem.id, WishlistItem.product_index, WishlistItem.created_at)
+            .filter(WishlistItem.user_id == user_id)
+            .filter(sa.or_(WishlistItem.created_at < created_at,
+                           sa.and_(WishlistItem.created_at == created_at, WishlistItem.id < 10 ** 9),
+                           WishlistItem.created_at.is_(None)))
+            .order_by(WishlistItem.created_at.desc(), WishlistItem.id.desc()).limit(49).statement),
+        ('get_wishlisted_status (delete)', sa.delete(WishlistItem)
+            .where(WishlistItem.user_id == user_id, WishlistItem.product_index == product_index)),
+        ('create_user_if_needed (email)', User.query.filter_by(email=f'user{user_id}@example.com').limit(1).statement),
+        ('create_user_if_needed (sub)', User.query.filter_by(sub=f'sub{user_id}').limit(1).statement),
+        ('get_full_user', User.query.filter_by(id=user_id).limit(1).statement),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default='explain.db')
+    parser.add_argument('--num_users', type=int, default=50000)
+    parser.add_argument('--clicks_per_user', type=int, default=60)
+    parser.add_argument('--wishlist_per_user', type=int, default=20)
+    parser.add_argument('--num_products', type=int, default=1000000)
+    parser.add_argument('--limit', type=int, default=32)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.abspath(args.db)}"
+    db.init_app(app)
+    with app.app_context():
+        if not os.path.exists(args.db):
+            db.create_all()
+            start_time = time.perf_counter()
+            seed(args.num_users, args.clicks_per_user, args.wishlist_per_user, args.num_products, np.random.default_rng(0))
+            print(f"Seeded {args.num_users * args.clicks_per_user} clicks in {time.perf_counter() - start_time:.1f}s")
+        create_migration_indexes()
+
+        for name, statement in core_queries(user_id=args.num_users // 2, product_index=7, limit=args.limit):
+            sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds' : True}))
+            plan = db.session.execute(sa.text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+            start_time = time.perf_counter()
+            if not isinstance(statement, sa.Delete):
+                db.session.execute(statement).fetchall()
+            print(f"\n== {name} ({(time.perf_counter() - start_time) * 1000:.2f}ms)\n{sql}")
+            for row in plan:
+                print(f"  {row[-1]}")
+        db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
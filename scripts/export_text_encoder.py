@@ -0,0 +1,137 @@
+"""Exports the ViT-B-32 text tower as TorchScript or ONNX (optionally int8 dynamically quantized) with the tokenizer's
+BPE merges, checks it against the open_clip reference and prints single-query latencies. The export is written to a
+temporary directory and only moved into DATA_ROOT_DIR if the check passes, otherwise the script exits with 1.
+
+Usage (from the repo root):
+    python -m scripts.export_text_encoder --runtime ONNX --quantize
+Serve it with TEXT_ENCODER_RUNTIME=ONNX TEXT_ENCODER_QUANTIZED=True.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+import open_clip
+import artifacts_loader
+import text_encoders
+from config import Config
+from clip_tokenizer import ClipTokenizer
+
+torch.set_grad_enabled(False)
+
+DEFAULT_QUERIES = [
+    'parachute jeans with pleats',
+    'christmas dinner dress',
+    'jumpsuit for diwali',
+    'sexy red corset',
+    'denim jeans with knee pockets',
+    'Office wear',
+    'Brunch outfit',
+    'Feminine Lace Dress with Delicate Detailing',
+    'Shirt',
+    'kurta',
+    'Basic comfy lounge shorts',
+    'Boolywood sarees for wedding',
+    'oversized graphic t-shirt',
+    'white sneakers for men',
+    'pastel lehenga for sangeet',
+    'black leather jacket',
+]
+
+
+class TextTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, tokens):
+        return self.model.encode_text(tokens)
+
+
+def in_directory(directory, path):
+    return os.path.join(directory, os.path.basename(path))
+
+def export_torchscript(tower, example_tokens, quantize, directory):
+    if quantize:
+        tower = torch.ao.quantization.quantize_dynamic(tower, {torch.nn.Linear}, dtype=torch.qint8)
+    path = in_directory(directory, text_encoders.get_text_encoder_path(text_encoders.TORCHSCRIPT, quantized=quantize))
+    torch.jit.save(torch.jit.trace(tower, example_tokens), path)
+    return path
+
+def export_onnx(tower, example_tokens, quantize, directory):
+    path = in_directory(directory, text_encoders.get_text_encoder_path(text_encoders.ONNX))
+    torch.onnx.export(tower, (example_tokens,), path, input_names=['tokens'], output_names=['embeddings'],
+                      dynamic_axes={'tokens' : {0 : 'batch'}, 'embeddings' : {0 : 'batch'}}, opset_version=17)
+    if not quantize:
+        return path
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantized_path = in_directory(directory, text_encoders.get_text_encoder_path(text_encoders.ONNX, quantized=True))
+    quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+def encode_normalized(encoder, tokenizer, queries):
+    embeddings = np.array(encoder.encode_text(tokenizer(queries)), dtype=np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=-1, keepdims=True)
+
+def single_query_latencies_ms(encoder, tokenizer, queries, repeats=5):
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            tokens = tokenizer([query])
+            start_time = time.perf_counter()
+            encoder.encode_text(tokens)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runtime', required=True, choices=(text_encoders.TORCHSCRIPT, text_encoders.ONNX))
+    parser.add_argument('--quantize', action='store_true', help='int8 dynamic quantization of the linear layers.')
+    parser.add_argument('--queries', default=None, help='Text file with one query per line for the equivalence check.')
+    parser.add_argument('--min_cosine', type=float, default=0.999)
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    tokenizer = open_clip.get_tokenizer('ViT-B-32')
+    model = artifacts_loader.load_open_clip_text_model(compile=False)
+    tower = TextTower(model).eval()
+    example_tokens = tokenizer(queries[:2])
+    # In DATA_ROOT_DIR, so moving the files into place is a rename.
+    with tempfile.TemporaryDirectory(dir=Config.DATA_ROOT_DIR, prefix='.export_text_encoder-') as directory:
+        if args.runtime == text_encoders.TORCHSCRIPT:
+            path = export_torchscript(tower, example_tokens, args.quantize, directory)
+        else:
+            path = export_onnx(tower, example_tokens, args.quantize, directory)
+        # Served with clip_tokenizer, so workers don't import open_clip.
+        tokenizer_path = in_directory(directory, text_encoders.get_tokenizer_path())
+        shutil.copyfile(open_clip.tokenizer.default_bpe(), tokenizer_path)
+
+        reference = text_encoders.OpenClipTextEncoder(model)
+        exported = text_encoders.load_exported_text_encoder(args.runtime, path=path)
+        exported_tokenizer = ClipTokenizer(tokenizer_path)
+        cosines = (encode_normalized(reference, tokenizer, queries) * encode_normalized(exported, exported_tokenizer, queries)).sum(axis=-1)
+        print(f"Cosine vs open_clip over {len(queries)} queries: min={cosines.min():.5f} mean={cosines.mean():.5f}")
+
+        for name, encoder, encoder_tokenizer in [('open_clip (eager)', reference, tokenizer),
+                                                 (f'{args.runtime}{" int8" if args.quantize else ""}', exported, exported_tokenizer)]:
+            latencies = single_query_latencies_ms(encoder, encoder_tokenizer, queries)
+            print(f"{name:<20} p50={np.percentile(latencies, 50):7.2f}ms  p99={np.percentile(latencies, 99):7.2f}ms")
+
+        if cosines.min() < args.min_cosine:
+            print(f"FAIL: min cosine {cosines.min():.5f} < {args.min_cosine}, {os.path.basename(path)} not written")
+            sys.exit(1)
+        for temporary_path in (path, tokenizer_path):
+            os.replace(temporary_path, os.path.join(Config.DATA_ROOT_DIR, os.path.basename(temporary_path)))
+    print(f"PASS : Wrote {os.path.basename(path)} and {os.path.basename(tokenizer_path)} to {Config.DATA_ROOT_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Bulk loads closed click log segments (LOGGING_DESTINATION=FILE) into the user_click table.
+
+Each segment is inserted in one transaction, then moved to <log_dir>/loaded/ (or deleted with --delete), so the
+command can run periodically, e.g. from cron, and be rerun after failures. Segments can also be replayed into
+another database by copying them back into the log directory.
+
+Usage (from the repo root, with the same DATABASE_TYPE / credentials as the app):
+    python -m scripts.load_click_logs [--log_dir click_logs] [--stale_seconds 3600] [--delete]
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from flask import Flask
+from config import Config
+from db import db
+from models import UserClick
+import click_log
+
+COLUMNS = ('user_id', 'session_id', 'product_index', 'search_query', 'referrer', 'clicked_at', 'ip', 'user_agent')
+
+
+def to_db_row(row):
+    db_row = {column : row.get(column) for column in COLUMNS}
+    if db_row['clicked_at']:
+        db_row['clicked_at'] = datetime.fromisoformat(db_row['clicked_at'])
+    return db_row
+
+
+def load_segment(path, batch_size):
+    rows = [to_db_row(row) for row in click_log.read_segment(path)]
+    try:
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(UserClick.__table__.insert(), rows[start:start + batch_size])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log_dir', default=Config.LOGGING_FILE_DIR)
+    parser.add_argument('--stale_seconds', type=int, default=3600,
+                        help="Also load .open segments not written to for this long whose writer process is dead, e.g. a killed worker.")
+    parser.add_argument('--batch_size', type=int, default=5000)
+    parser.add_argument('--delete', action='store_true', help="Delete loaded segments instead of moving them to loaded/.")
+    parser.add_argument('--dry_run', action='store_true')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+
+    loaded_dir = os.path.join(args.log_dir, 'loaded')
+    os.makedirs(loaded_dir, exist_ok=True)
+    segments = click_log.closed_segments(args.log_dir, stale_seconds=args.stale_seconds)
+    print(f"Found {len(segments)} segments in {args.log_dir}")
+
+    total_rows, start_time = 0, time.perf_counter()
+    with app.app_context():
+        for path in segments:
+            if args.dry_run:
+                print(f"{path} : {sum(1 for _ in click_log.read_segment(path))} rows")
+                continue
+            try:
+                num_rows = load_segment(path, args.batch_size)
+            except Exception as e:
+                print(f"ERROR: Loading {path} failed, leaving it in place. {e=}")
+                continue
+            if args.delete:
+                os.remove(path)
+            else:
+                os.replace(path, os.path.join(loaded_dir, os.path.basename(path)))
+            total_rows += num_rows
+            print(f"{path} : {num_rows} rows")
+    print(f"Loaded {total_rows} rows in {time.perf_counter() - start_time:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Sends concurrent requests to a running server and prints throughput and p50 / p99 latency per path.
+
+Run it against the same server before and after a change, e.g. for /inspiration and anonymous /api/feed:
+    gunicorn app:app &
+    python -m scripts.load_test --url http://localhost:8000 --paths /inspiration /api/feed --concurrency 16
+"""
+import argparse
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+def fetch(url, method, headers):
+    request = urllib.request.Request(url, method=method, headers=headers, data=b'{}' if method == 'POST' else None)
+    start_time = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return (time.perf_counter() - start_time) * 1000, status
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--paths', nargs='+', default=['/inspiration', '/api/feed'])
+    parser.add_argument('--method', default=None, help="Defaults to POST for /api/ paths and GET otherwise.")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000, help="Per path.")
+    parser.add_argument('--user_agent', default='load_test')
+    parser.add_argument('--cookie', default='', help="Sent as the Cookie header, e.g. to test as a logged in user.")
+    args = parser.parse_args()
+
+    headers = {'User-Agent' : args.user_agent, 'Content-Type' : 'application/json'}
+    if args.cookie:
+        headers['Cookie'] = args.cookie
+
+    print(f"{'path':>24} {'req/s':>8} {'p50_ms':>8} {'p99_ms':>8} {'errors':>6}")
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for path in args.paths:
+            method = args.method or ('POST' if path.startswith('/api/') else 'GET')
+            url = args.url.rstrip('/') + path
+            start_time = time.perf_counter()
+            results = list(executor.map(lambda _: fetch(url, method, headers), range(args.requests)))
+            elapsed = time.perf_counter() - start_time
+            latencies = np.array([latency for latency, _ in results])
+            errors = sum(status >= 400 for _, status in results)
+            print(f"{path:>24} {len(results) / elapsed:8.1f} {np.percentile(latencies, 50):8.2f} "
+                  f"{np.percentile(latencies, 99):8.2f} {errors:>6}")
+
+
+if __name__ == '__main__':
+    main()
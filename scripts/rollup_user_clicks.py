@@ -0,0 +1,70 @@
+"""Rolls user_click rows older than USER_CLICK_RETENTION_DAYS up into daily counts in user_click_daily, and deletes them.
+
+Each day is moved in its own transaction (insert the counts, delete the rows), so the script can be stopped and
+rerun at any point, e.g. nightly from cron.
+
+Usage (from the repo root, with the same DATABASE_TYPE / credentials as the app):
+    python -m scripts.rollup_user_clicks [--retention_days 180] [--max_days 30] [--dry_run]
+"""
+import argparse
+import datetime
+import time
+import sqlalchemy as sa
+from flask import Flask
+from config import Config
+from db import db
+from models import UserClick, UserClickDaily
+
+GROUP_COLUMNS = (UserClick.user_id, UserClick.product_index, UserClick.search_query)
+
+
+def rollup_day(day):
+    start = datetime.datetime.combine(day, datetime.time())
+    end = start + datetime.timedelta(days=1)
+    in_day = sa.and_(UserClick.clicked_at >= start, UserClick.clicked_at < end)
+    counts = sa.select(sa.literal(day, sa.Date), *GROUP_COLUMNS, sa.func.count()).where(in_day).group_by(*GROUP_COLUMNS)
+    try:
+        inserted = db.session.execute(sa.insert(UserClickDaily).from_select(
+            ['day', 'user_id', 'product_index', 'search_query', 'clicks'], counts)).rowcount
+        deleted = db.session.execute(sa.delete(UserClick).where(in_day)).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return inserted, deleted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--retention_days', type=int, default=Config.USER_CLICK_RETENTION_DAYS)
+    parser.add_argument('--max_days', type=int, default=None, help="Roll up at most this many days per run.")
+    parser.add_argument('--dry_run', action='store_true')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+
+    cutoff = datetime.date.today() - datetime.timedelta(days=args.retention_days)
+    with app.app_context():
+        oldest = db.session.query(sa.func.min(UserClick.clicked_at)).scalar()
+        if oldest is None or oldest.date() >= cutoff:
+            print(f"Nothing older than {cutoff}")
+            return
+        days = [oldest.date() + datetime.timedelta(days=i) for i in range((cutoff - oldest.date()).days)]
+        days = days[:args.max_days] if args.max_days else days
+        print(f"Rolling up {len(days)} days, {days[0]} to {days[-1]}")
+        for day in days:
+            start_time = time.perf_counter()
+            if args.dry_run:
+                start = datetime.datetime.combine(day, datetime.time())
+                num_rows = db.session.query(sa.func.count(UserClick.id)) \
+                    .filter(UserClick.clicked_at >= start, UserClick.clicked_at < start + datetime.timedelta(days=1)).scalar()
+                print(f"{day} : {num_rows} rows")
+                continue
+            inserted, deleted = rollup_day(day)
+            print(f"{day} : {deleted} rows -> {inserted} daily counts in {time.perf_counter() - start_time:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""Prints the memory of each gunicorn worker, split into what's unique to the worker and what's shared.
+
+USS (unique set size) is what each extra worker really costs; PSS splits shared pages evenly across the
+processes mapping them. Usage, with the server running:
+    python -m scripts.worker_memory_report --pid $(pgrep -o -f gunicorn)
+"""
+import argparse
+import psutil
+
+
+def mb(num_bytes):
+    return f"{num_bytes / 2**20:9.1f}MB"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pid', type=int, required=True, help='pid of the gunicorn master.')
+    args = parser.parse_args()
+
+    master = psutil.Process(args.pid)
+    processes = [('master', master)] + [(f'worker', child) for child in master.children()]
+    total_uss, total_pss = 0, 0
+    print(f"{'process':<8} {'pid':>8} {'rss':>11} {'uss':>11} {'pss':>11} {'shared':>11}")
+    for name, process in processes:
+        memory = process.memory_full_info()
+        total_uss, total_pss = total_uss + memory.uss, total_pss + memory.pss
+        print(f"{name:<8} {process.pid:>8} {mb(memory.rss)} {mb(memory.uss)} {mb(memory.pss)} {mb(memory.shared)}")
+    print(f"Total USS {mb(total_uss)}, total PSS (actual footprint) {mb(total_pss)}, {len(processes) - 1} workers")
+
+
+if __name__ == '__main__':
+    main()
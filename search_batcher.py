@@ -0,0 +1,125 @@
+import threading
+import queue
+import time
+import bisect
+from concurrent.futures import Future
+import numpy as np
+
+
+class Histogram:
+    """Counts of observations per bucket. bucket i counts values <= bounds[i], the last bucket everything above."""
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+
+    def to_dict(self):
+        labels = [f'<={bound}' for bound in self.bounds] + [f'>{self.bounds[-1]}']
+        return dict(zip(labels, self.counts))
+
+
+class SearchBatcher:
+    """Coalesces concurrent searches into one encode_many and one index.search call.
+
+    A search that arrives while no other search is pending runs inline on the calling thread, so an
+    idle worker pays no queueing latency. Otherwise it's queued, and a background thread collects up
+    to max_batch_size queries, waiting at most max_wait_ms for stragglers, and fans the results back
+    out through futures.
+    """
+    def __init__(self, get_query_encoder, get_index, max_batch_size=32, max_wait_ms=3, enabled=True):
+        # Callables, so artifacts that are still loading or get reloaded are picked up.
+        self.get_query_encoder, self.get_index = get_query_encoder, get_index
+        self.max_batch_size, self.max_wait_ms, self.enabled = max_batch_size, max_wait_ms, enabled
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._thread = None
+        self.batch_size_histogram = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.wait_ms_histogram = Histogram([0.1, 0.5, 1, 2, 5, 10, 20])
+        self.batch_ms_histogram = Histogram([1, 2, 5, 10, 20, 50, 100])
+
+    def search(self, query, k):
+        """Returns the top-k indices for the query, an array of shape [k]."""
+        with self._lock:
+            self._pending += 1
+            run_inline = (not self.enabled) or self._pending == 1
+        try:
+            if run_inline:
+                self.batch_size_histogram.observe(1)
+                self.wait_ms_histogram.observe(0)
+                return self._search_batch([query], k)[0]
+            
+            self._ensure_thread()
+            future = Future()
+            self._queue.put((query, k, future, time.perf_counter()))
+            return future.result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        return {
+            'batch_size' : self.batch_size_histogram.to_dict(),
+            'wait_ms' : self.wait_ms_histogram.to_dict(),
+            'batch_ms' : self.batch_ms_histogram.to_dict(),
+        }
+
+    def _search_batch(self, queries, k):
+        start_time = time.perf_counter()
+        embeddings = self.get_query_encoder().encode_many(queries)
+        _, topk_indices = self.get_index().search(embeddings, k)
+        self.batch_ms_histogram.observe((time.perf_counter() - start_time) * 1000)
+        return topk_indices
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='search-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            # Everything in flight is already in the batch (or running inline), nothing to wait for.
+            with self._lock:
+                if self._pending <= len(batch) + 1:
+                    break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            now = time.perf_counter()
+            for _, _, _, enqueued_at in batch:
+                self.wait_ms_histogram.observe((now - enqueued_at) * 1000)
+            self.batch_size_histogram.observe(len(batch))
+            
+            k = max(item_k for _, item_k, _, _ in batch)
+            try:
+                topk_indices = self._search_batch([query for query, _, _, _ in batch], k)
+            except Exception as e:
+                print(f"ERROR: batched search failed for {len(batch)} queries, {e=}")
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for i, (_, item_k, future, _) in enumerate(batch):
+                future.set_result(np.array(topk_indices[i][:item_k]))
@@ -0,0 +1,85 @@
+import os
+import faiss
+import numpy as np
+from config import Config
+
+DIM = 512
+FLAT, IVF_FLAT, HNSW, IVF_PQ = 'FLAT', 'IVF_FLAT', 'HNSW', 'IVF_PQ'
+# Exhaustive scans over reduced precision codes : float16 (2x smaller) and 8-bit scalar quantization (4x smaller).
+SQ_FP16, SQ8, IVF_SQ8 = 'SQ_FP16', 'SQ8', 'IVF_SQ8'
+INDEX_TYPES = (FLAT, IVF_FLAT, HNSW, IVF_PQ, SQ_FP16, SQ8, IVF_SQ8)
+IVF_INDEX_TYPES = (IVF_FLAT, IVF_PQ, IVF_SQ8)
+EMBEDDINGS_DTYPES = ('float32', 'float16')
+# Rows added to an index at a time, so float16 / memory-mapped embeddings are only converted chunk by chunk.
+ADD_BATCH_SIZE = 65536
+
+
+def get_factory_string(index_type):
+    """faiss.index_factory description for the index type, using the build parameters from Config."""
+    if index_type == FLAT:
+        return 'Flat'
+    if index_type == IVF_FLAT:
+        return f'IVF{Config.FAISS_NLIST},Flat'
+    if index_type == HNSW:
+        return f'HNSW{Config.FAISS_HNSW_M},Flat'
+    if index_type == IVF_PQ:
+        return f'IVF{Config.FAISS_NLIST},PQ{Config.FAISS_PQ_M}x8'
+    if index_type == SQ_FP16:
+        return 'SQfp16'
+    if index_type == SQ8:
+        return 'SQ8'
+    if index_type == IVF_SQ8:
+        return f'IVF{Config.FAISS_NLIST},SQ8'
+    raise ValueError(f"Unknown faiss index type {index_type=}, expected one of {INDEX_TYPES}")
+
+def get_index_path(index_type):
+    return os.path.join(Config.DATA_ROOT_DIR, f'faiss_{index_type.lower()}.index')
+
+def get_embeddings_path(dtype='float32'):
+    suffix = '' if dtype == 'float32' else f'_{dtype}'
+    return os.path.join(Config.DATA_ROOT_DIR, f'image_embeddings_normalized{suffix}.npy')
+
+def read_index(path, mmap=True, index_type=None):
+    """Reads a serialized index. With mmap the index data stays in the (shared) page cache instead of
+    being copied into each process.
+
+    IVF inverted lists are mmapped with IO_FLAG_MMAP by every faiss version. Flat / SQ / HNSW codes are only
+    mmapped with IO_FLAG_MMAP_IFC, which faiss-cpu 1.7.4 (pinned) doesn't have, so there they're read into the
+    heap. The two flags can't be combined, IVF indexes fail to load with both. Without index_type, the other
+    flag is tried when the first one fails."""
+    if not mmap:
+        return faiss.read_index(path)
+    flags = [faiss.IO_FLAG_MMAP]
+    if hasattr(faiss, 'IO_FLAG_MMAP_IFC') and index_type not in IVF_INDEX_TYPES:
+        flags = [faiss.IO_FLAG_MMAP_IFC] + ([] if index_type else flags)
+    for i, flag in enumerate(flags):
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            if i == len(flags) - 1:
+                raise
+            print(f"INFO: Couldn't mmap {path=} with {flag=}, retrying with the other flag. {e=}")
+
+def build_index(embeddings, index_type, train_size=None):
+    """Builds an inner-product index over normalized embeddings. IVF indexes are trained on a random subset of train_size rows."""
+    index = faiss.index_factory(DIM, get_factory_string(index_type), faiss.METRIC_INNER_PRODUCT)
+    if index_type == HNSW:
+        index.hnsw.efConstruction = Config.FAISS_EF_CONSTRUCTION
+    if not index.is_trained:
+        train_embeddings = embeddings
+        if train_size and train_size < len(embeddings):
+            train_rows = np.sort(np.random.default_rng(0).choice(len(embeddings), train_size, replace=False))
+            train_embeddings = embeddings[train_rows]
+        index.train(np.ascontiguousarray(train_embeddings, dtype=np.float32))
+    for start in range(0, len(embeddings), ADD_BATCH_SIZE):
+        index.add(np.ascontiguousarray(embeddings[start : start + ADD_BATCH_SIZE], dtype=np.float32))
+    return index
+
+def set_search_params(index, index_type, nprobe=None, ef_search=None):
+    """Applies the query-time knobs (nprobe for IVF, efSearch for HNSW). Defaults come from Config."""
+    params = faiss.ParameterSpace()
+    if index_type in IVF_INDEX_TYPES:
+        params.set_index_parameter(index, 'nprobe', nprobe or Config.FAISS_NPROBE)
+    elif index_type == HNSW:
+        params.set_index_parameter(index, 'efSearch', ef_search or Config.FAISS_EF_SEARCH)
+    return index
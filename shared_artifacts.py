@@ -0,0 +1,46 @@
+import mmap
+import numpy as np
+from catalog import Catalog, NumericColumn, StringColumn
+
+
+def to_shared_array(array, writeable=False):
+    """Copies the array into anonymous MAP_SHARED memory. Workers forked afterwards map the same pages, 
+    unlike copy-on-write heap memory, which gets duplicated as soon as anything writes near it."""
+    array = np.ascontiguousarray(array)
+    if array.nbytes == 0:
+        return array
+    buffer = mmap.mmap(-1, array.nbytes, flags=mmap.MAP_SHARED)
+    shared = np.frombuffer(buffer, dtype=array.dtype, count=array.size).reshape(array.shape)
+    shared[...] = array
+    shared.setflags(write=writeable)
+    return shared
+
+def to_shared_bytes(data):
+    """Same as to_shared_array for a bytes pool. Slicing the returned mmap gives bytes, like the original."""
+    if isinstance(data, mmap.mmap) or not data:
+        return data
+    buffer = mmap.mmap(-1, len(data), flags=mmap.MAP_SHARED)
+    buffer.write(data)
+    return buffer
+
+def _is_file_backed(array):
+    # np.load(mmap_mode='r') arrays are already shared through the page cache.
+    return isinstance(array, np.memmap) or isinstance(array.base, mmap.mmap)
+
+def share(value):
+    """Returns the artifact backed by shared memory. Supports numpy arrays, torch tensors and catalogs; anything else is returned as is."""
+    if isinstance(value, np.ndarray):
+        return value if _is_file_backed(value) else to_shared_array(value)
+    if isinstance(value, Catalog):
+        for column in list(value.columns.values()) + [value.product_json]:
+            if isinstance(column, NumericColumn):
+                column.values = share(column.values)
+            elif isinstance(column, StringColumn):
+                column.offsets, column.nulls = share(column.offsets), share(column.nulls)
+                column.data = to_shared_bytes(column.data)
+        return value
+    if type(value).__module__.startswith('torch'):
+        import torch
+        # torch.from_numpy expects a writeable array.
+        return torch.from_numpy(to_shared_array(value.numpy(), writeable=True))
+    return value
@@ -1,6 +1,21 @@
 import unittest
+from unittest import mock
 import json
-from app import app
+import types
+import datetime
+import time
+import numpy as np
+from flask import Flask
+import sqlalchemy as sa
+from app import app, db
+from config import Config
+from models import WishlistItem
+import cookie_handler
+import core
+from artifact_registry import ArtifactRegistry
+from caches import StatsCache
+from catalog import Catalog
+from test_catalog import make_products_df
 
 class FlaskTestCase(unittest.TestCase):
 
@@ -32,5 +47,226 @@ class FlaskTestCase(unittest.TestCase):
         data = json.loads(response.data)
         self.assertIn('error', data)
 
+class ReadyzTestCase(unittest.TestCase):
+
+    def test_readyz_stats(self):
+        # Only the query encoder is loaded, with an empty cache.
+        registry = ArtifactRegistry(wait_timeout=0)
+        for name in core.artifacts.artifacts:
+            registry.register(name, lambda: None)
+        registry.set('query_encoder', types.SimpleNamespace(cache=StatsCache(maxsize=10)))
+        with mock.patch.object(core, 'artifacts', registry):
+            data = json.loads(app.test_client().get('/readyz').data)
+        self.assertEqual(set(data['search_batcher']), {'batch_size', 'wait_ms', 'batch_ms'})
+        self.assertEqual(data['query_embedding_cache']['size'], 0)
+        self.assertEqual(set(data['search_results_cache']), {'size', 'maxsize', 'hits', 'misses', 'hit_rate'})
+
+class ArtifactsNotReadyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app.test_client()
+        # Same artifacts as core, none of them loaded.
+        loading = ArtifactRegistry(wait_timeout=0)
+        for name in core.artifacts.artifacts:
+            loading.register(name, lambda: None)
+        patch = mock.patch.object(core, 'artifacts', loading)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_api_query_not_ready(self):
+        response = self.app.post('/api/query', json={'query': 'artifacts not ready'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.data), {'error': 'NOT_READY'})
+
+    def test_api_product_not_ready(self):
+        response = self.app.post('/api/product/0', json={})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '5')
+
+    def test_api_query_empty_while_loading(self):
+        for routes in ([], ['api_query']):
+            with self.subTest(product_json_routes=routes), mock.patch.object(Config, 'PRODUCT_JSON_ROUTES', routes):
+                response = self.app.post('/api/query', json={'query': ''})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.data)['products'], [])
+
+    def test_readyz_while_loading(self):
+        response = self.app.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertIsNone(json.loads(response.data)['query_embedding_cache'])
+
+class BotSearchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app.test_client()
+        registry = ArtifactRegistry(wait_timeout=0)
+        for name in core.artifacts.artifacts:
+            registry.register(name, lambda: None)
+        registry.set('catalog', Catalog.from_dataframe(make_products_df()))
+        self.search_batcher = mock.Mock()
+        for patch in (mock.patch.object(core, 'artifacts', registry),
+                      mock.patch.object(core, 'search_batcher', self.search_batcher),
+                      mock.patch.object(core, 'search_results_cache', StatsCache(maxsize=10, ttl=60))):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_bots_get_search_results_without_caching(self):
+        self.search_batcher.search.return_value = np.array([3, 1, 2, -1])
+        response = self.app.post('/api/query', json={'query': 'red dress'}, headers={'User-Agent': 'Googlebot/2.1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['index'] for product in json.loads(response.data)['products']], [3, 1, 2])
+        self.search_batcher.search.assert_called_once()
+        self.assertEqual(len(core.search_results_cache), 0)
+
+class WishlistTestCase(unittest.TestCase):
+    """Pagination and toggles against an in-memory SQLite database."""
+
+    def setUp(self):
+        self.db_app = Flask(__name__)
+        self.db_app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_ENGINE_OPTIONS={})
+        db.init_app(self.db_app)
+        self.context = self.db_app.test_request_context('/')
+        self.context.push()
+        self.addCleanup(self.context.pop)
+        db.create_all()
+        registry = ArtifactRegistry(wait_timeout=0)
+        for name in core.artifacts.artifacts:
+            registry.register(name, lambda: None)
+        registry.set('catalog', Catalog.from_dataframe(make_products_df(num_rows=50)))
+        patch = mock.patch.object(core, 'artifacts', registry)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def add_items(self, items, user_id=7):
+        # A core insert, the ORM would fill created_at=None with the column default.
+        db.session.execute(WishlistItem.__table__.insert(), [
+            {'id' : item_id, 'user_id' : user_id, 'product_index' : product_index, 'created_at' : created_at}
+            for item_id, product_index, created_at in items])
+        db.session.commit()
+
+    def get_all_pages(self, user_id=7, limit=2):
+        indices, cursor = [], None
+        while True:
+            products, cursor, err = core.get_wishlisted_products_page(user_id, cursor=cursor, limit=limit)
+            self.assertIsNone(err)
+            indices += [product['index'] for product in products]
+            if cursor is None:
+                return indices
+
+    def test_pages_with_created_at_ties_and_nulls(self):
+        tie, earlier = datetime.datetime(2024, 1, 2), datetime.datetime(2024, 1, 1)
+        # Rows from before the created_at column have it NULL, they come last.
+        self.add_items([(1, 10, None), (2, 11, earlier), (3, 12, tie), (4, 13, tie), (5, 14, None), (6, 15, tie),
+                        (7, 16, None)])
+        self.add_items([(8, 17, tie)], user_id=8)
+        for limit in (1, 2, 3, 7, 100):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.get_all_pages(limit=limit), [15, 13, 12, 11, 16, 14, 10])
+
+    def test_skips_products_missing_from_catalog(self):
+        self.add_items([(1, 10, datetime.datetime(2024, 1, 1)), (2, 1000, datetime.datetime(2024, 1, 2))])
+        products, cursor, err = core.get_wishlisted_products_page(7, limit=1)
+        self.assertEqual((products, err), ([], None))
+        self.assertEqual(self.get_all_pages(limit=1), [10])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            core.get_wishlisted_products_page(7, cursor='not a cursor')
+
+    def test_double_toggle(self):
+        self.assertEqual(core.get_wishlisted_status(7, 10), (True, None))
+        self.assertEqual(core.get_wishlisted_status(7, 10), (False, None))
+        self.assertEqual(db.session.query(WishlistItem).count(), 0)
+
+    def test_concurrent_insert_hits_unique_constraint(self):
+        self.add_items([(1, 10, None)])
+        # The other request inserted after this one's DELETE found nothing.
+        missed_delete = lambda model: sa.delete(model).where(sa.false())
+        with mock.patch.object(core, 'delete', missed_delete):
+            self.assertEqual(core.get_wishlisted_status(7, 10), (True, None))
+        self.assertEqual(db.session.query(WishlistItem.product_index).all(), [(10,)])
+
+
+class WishlistPageSizeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.set_cookie('auth_info', cookie_handler.serializer.dumps({'user_id' : 7, 'session_id' : 'abc'}))
+
+    def test_bad_requests(self):
+        for query in ('limit=0', f'limit={Config.WISHLIST_MAX_PAGE_SIZE + 1}', 'limit=abc', 'cursor=not-a-cursor'):
+            with self.subTest(query=query):
+                response = self.app.get(f'/api/wishlist?{query}')
+                self.assertEqual(response.status_code, 400)
+
+    def test_page_size_bounds(self):
+        with mock.patch.object(core, 'get_wishlisted_products_page', return_value=([], None, None)) as get_page:
+            for limit in (1, Config.WISHLIST_MAX_PAGE_SIZE):
+                response = self.app.get(f'/api/wishlist?limit={limit}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(get_page.call_args.kwargs['limit'], limit)
+            self.app.get('/api/wishlist?cursor=')
+            self.assertEqual(get_page.call_args.kwargs['limit'], Config.WISHLIST_PAGE_SIZE)
+
+class SearchResultsCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        registry = ArtifactRegistry(wait_timeout=0)
+        for name in core.artifacts.artifacts:
+            registry.register(name, lambda: None)
+        registry.set('catalog', Catalog.from_dataframe(make_products_df()))
+        self.search_batcher = mock.Mock()
+        self.search_batcher.search.side_effect = lambda query, n: np.arange(n)
+        self.cache = StatsCache(maxsize=10, ttl=60)
+        for patch in (mock.patch.object(core, 'artifacts', registry),
+                      mock.patch.object(core, 'search_batcher', self.search_batcher),
+                      mock.patch.object(core, 'search_results_cache', self.cache)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def search(self, query, n=8, is_bot=False, as_json=False):
+        with app.test_request_context('/'):
+            core.g.is_bot = is_bot
+            return core.get_search_results(query, n=n, as_json=as_json)
+
+    def test_hits_and_misses(self):
+        products = self.search('red dress')
+        self.assertEqual([product['index'] for product in products], list(range(9)))
+        self.assertEqual([product['index'] for product in self.search('red dress')], list(range(9)))
+        self.assertEqual(self.search_batcher.search.call_count, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_keyed_by_normalized_query_and_n(self):
+        self.search('red dress')
+        self.search('Red-Dress ')
+        self.assertEqual(self.search_batcher.search.call_count, 1)
+        self.search('red dress', n=16)
+        self.search('blue dress')
+        self.assertEqual(self.search_batcher.search.call_count, 3)
+        self.assertEqual(set(key for key, _ in self.cache.items()), {('red dress', 8), ('red dress', 16), ('blue dress', 8)})
+
+    def test_products_json_is_cached(self):
+        products_json = self.search('red dress', as_json=True)
+        self.assertEqual([product['index'] for product in json.loads(products_json)], list(range(9)))
+        self.assertIs(self.search('red dress', as_json=True), products_json)
+
+    def test_ttl_expiry(self):
+        self.cache = StatsCache(maxsize=10, ttl=0.05)
+        with mock.patch.object(core, 'search_results_cache', self.cache):
+            self.search('red dress')
+            time.sleep(0.1)
+            self.search('red dress')
+        self.assertEqual(self.search_batcher.search.call_count, 2)
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_bots_dont_insert(self):
+        self.search('red dress', is_bot=True)
+        self.assertEqual(len(self.cache), 0)
+        self.search('red dress')
+        # Bots read entries inserted by users.
+        self.search('red dress', is_bot=True)
+        self.assertEqual(self.search_batcher.search.call_count, 2)
+        self.assertEqual(self.cache.hits, 1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,38 @@
+import unittest
+import threading
+from artifact_registry import ArtifactRegistry, ArtifactNotReady, READY, FAILED
+
+
+class ArtifactRegistryTestCase(unittest.TestCase):
+
+    def test_background_loading_with_deps(self):
+        release = threading.Event()
+        registry = ArtifactRegistry(wait_timeout=0.05)
+        registry.register('embeddings', lambda: release.wait() and [1, 2, 3])
+        registry.register('index', lambda embeddings: sum(embeddings), deps=('embeddings',))
+        registry.register('inspirations', lambda: {'MAN' : [], 'WOMAN' : []})
+        registry.load_all(background=True)
+
+        self.assertEqual(registry.get('inspirations', timeout=1), {'MAN' : [], 'WOMAN' : []})
+        with self.assertRaises(ArtifactNotReady):
+            registry['index']
+        self.assertFalse(registry.is_ready())
+
+        release.set()
+        self.assertEqual(registry.get('index', timeout=1), 6)
+        self.assertTrue(registry.is_ready())
+        self.assertEqual(registry.status()['index']['state'], READY)
+
+    def test_failed_artifact(self):
+        registry = ArtifactRegistry()
+        registry.register('catalog', lambda: 1 / 0)
+        registry.load_all()
+        self.assertEqual(registry.status()['catalog']['state'], FAILED)
+        with self.assertRaises(ArtifactNotReady):
+            registry['catalog']
+        registry.set('catalog', 'reloaded')
+        self.assertEqual(registry['catalog'], 'reloaded')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import threading
+import time
+from batch_writer import BatchWriter
+
+
+class TestBatchWriter(unittest.TestCase):
+    def test_batches_by_size_and_wait(self):
+        batches, written = [], threading.Event()
+        def write_batch(rows):
+            batches.append(rows)
+            if sum(len(batch) for batch in batches) == 7:
+                written.set()
+
+        writer = BatchWriter(write_batch, max_batch_size=5, max_wait_ms=20)
+        for i in range(7):
+            self.assertTrue(writer.put(i))
+        self.assertTrue(written.wait(2))
+        self.assertEqual([row for batch in batches for row in batch], list(range(7)))
+        self.assertTrue(all(len(batch) <= 5 for batch in batches))
+        self.assertEqual(writer.stats()['written'], 7)
+
+    def test_drops_on_overflow_and_flushes(self):
+        release = threading.Event()
+        rows_written = []
+        def write_batch(rows):
+            release.wait(2)
+            rows_written.extend(rows)
+
+        writer = BatchWriter(write_batch, max_queue_size=2, max_batch_size=1, max_wait_ms=0)
+        writer.put('blocked')
+        time.sleep(0.05) # The thread takes 'blocked' and waits in write_batch.
+        results = [writer.put(i) for i in range(4)]
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(writer.stats()['dropped'], 2)
+        release.set()
+        writer.flush()
+        self.assertEqual(sorted(rows_written[1:]), [0, 1])
+
+    def test_failed_batches_are_counted(self):
+        def write_batch(rows):
+            raise RuntimeError('database is down')
+
+        writer = BatchWriter(write_batch, max_wait_ms=0)
+        writer.put(1)
+        writer.flush()
+        time.sleep(0.05)
+        self.assertEqual(writer.stats()['failed'], 1)
+
+    def test_on_idle_runs_between_batches(self):
+        batches, idle = [], threading.Event()
+        writer = BatchWriter(batches.append, max_wait_ms=0, on_idle=lambda: batches and idle.set(), idle_seconds=0.05)
+        writer.put(1)
+        self.assertTrue(idle.wait(2))
+        self.assertEqual(batches, [[1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from bots import BotDetector
+
+
+class TestBotDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = BotDetector(['googlebot', 'openai.com', 'semrushbot'])
+
+    def test_matches_case_insensitive_substrings(self):
+        self.assertTrue(self.detector.is_bot('Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'))
+        self.assertTrue(self.detector.is_bot('Mozilla/5.0 (compatible; GPTBot/1.0; +https://openai.com/gptbot)'))
+        self.assertFalse(self.detector.is_bot('Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Safari/604.1'))
+        # '.' is escaped, not a wildcard.
+        self.assertFalse(self.detector.is_bot('openaixcom'))
+        self.assertFalse(self.detector.is_bot(''))
+
+    def test_memoizes_verdicts(self):
+        for _ in range(3):
+            self.detector.is_bot('SemrushBot/7')
+        stats = self.detector.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_no_patterns(self):
+        self.assertFalse(BotDetector([]).is_bot('Googlebot'))
+
+
+if __name__ == '__main__':
+    unittest.main()
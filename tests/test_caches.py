@@ -0,0 +1,64 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from caches import StatsCache
+from query_encoder import QueryEncoder, normalize_query
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    def encode_text(self, tokens):
+        self.calls += 1
+        return np.array(tokens, dtype=np.float32)
+
+
+def fake_tokenizer(queries):
+    return [[len(query), 1.0, 2.0] for query in queries]
+
+
+class StatsCacheTestCase(unittest.TestCase):
+
+    def test_lru_eviction_and_counters(self):
+        cache = StatsCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)  # Evicts 'b', the least recently used.
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(len(cache), 2)
+
+
+class QueryEncoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.model = FakeModel()
+        self.encoder = QueryEncoder(self.model, fake_tokenizer, StatsCache(maxsize=16))
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query(' Red-Dress  for\tDiwali '), 'red dress for diwali')
+
+    def test_encode_is_cached_by_normalized_query(self):
+        first = self.encoder.encode('red-dress')
+        second = self.encoder.encode('Red  Dress')
+        self.assertEqual(self.model.calls, 1)
+        np.testing.assert_array_equal(first, second)
+        self.assertAlmostEqual(float(np.linalg.norm(first)), 1.0, places=5)
+
+    def test_warm_file_roundtrip(self):
+        self.encoder.encode('kurta')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'warm.npz')
+            self.assertEqual(self.encoder.save_warm_file(path), 1)
+            encoder = QueryEncoder(self.model, fake_tokenizer, StatsCache(maxsize=16))
+            self.assertEqual(encoder.load_warm_file(path), 1)
+            encoder.encode('KURTA')
+        self.assertEqual(self.model.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import tempfile
+import json
+import math
+import numpy as np
+import pandas as pd
+from catalog import Catalog, PRODUCT_COLUMNS
+
+
+def make_products_df(num_rows=300):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'index' : np.arange(num_rows),
+        'product_name' : [f'Brand{i % 7} Kurta ✨ {i}' for i in range(num_rows)],
+        'brand' : [f'Brand{i % 7}' if i % 50 else None for i in range(num_rows)],
+        'price' : rng.integers(100, 5000, num_rows),
+        'primary_image' : [f'https://assets.example.com/assets/{i}.jpg' for i in range(num_rows)],
+        'product_url' : [f'https://example.com/kurta/brand/product-{i}/{i}/buy' for i in range(num_rows)],
+        'rating' : [float(rng.random() * 5) if i % 3 else float('nan') for i in range(num_rows)],
+        'rating_count' : rng.integers(0, 1000, num_rows),
+        'unused_column' : ['x'] * num_rows,
+    })
+
+
+def assert_rows_equal(test_case, rows, expected_rows):
+    test_case.assertEqual(len(rows), len(expected_rows))
+    for row, expected in zip(rows, expected_rows):
+        test_case.assertEqual(set(row.keys()), set(PRODUCT_COLUMNS))
+        for key in PRODUCT_COLUMNS:
+            value, expected_value = row[key], expected[key]
+            if isinstance(expected_value, float) and math.isnan(expected_value):
+                test_case.assertTrue(value is None or math.isnan(value))
+            else:
+                test_case.assertEqual(value, expected_value)
+                test_case.assertEqual(type(value), type(expected_value))
+
+
+class CatalogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.df = make_products_df()
+        self.indices = np.random.default_rng(1).choice(len(self.df), 128, replace=False)
+
+    def test_get_rows_matches_dataframe(self):
+        catalog = Catalog.from_dataframe(self.df)
+        assert_rows_equal(self, catalog.get_rows(self.indices), self.df[list(PRODUCT_COLUMNS)].iloc[self.indices].to_dict('records'))
+
+    def test_saved_catalog_matches_dataframe(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            Catalog.from_dataframe(self.df).save(tmpdir)
+            catalog = Catalog.load(tmpdir)
+            self.assertEqual(len(catalog), len(self.df))
+            assert_rows_equal(self, catalog.get_rows(self.indices), self.df[list(PRODUCT_COLUMNS)].iloc[self.indices].to_dict('records'))
+            self.assertEqual(catalog.get_row(3, columns=('index', 'brand')), {'index' : 3, 'brand' : 'Brand3'})
+            del catalog
+
+    def test_product_json_matches_dataframe(self):
+        catalog = Catalog.from_dataframe(self.df)
+        catalog.build_product_json()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            catalog.save(tmpdir)
+            saved_catalog = Catalog.load(tmpdir)
+            expected_rows = self.df[list(PRODUCT_COLUMNS)].iloc[self.indices].to_dict('records')
+            assert_rows_equal(self, json.loads(saved_catalog.get_json(self.indices)), expected_rows)
+            # Falls back to serializing rows when the fragments weren't built.
+            assert_rows_equal(self, json.loads(Catalog.from_dataframe(self.df).get_json(self.indices)), expected_rows)
+            self.assertEqual(saved_catalog.get_json([]), b'[]')
+            
+            product = json.loads(saved_catalog.get_json_object(7, is_wishlisted=True))
+            assert_rows_equal(self, [{key : value for key, value in product.items() if key != 'is_wishlisted'}],
+                              self.df[list(PRODUCT_COLUMNS)].iloc[[7]].to_dict('records'))
+            self.assertIs(product['is_wishlisted'], True)
+
+            is_wishlisted = [i % 2 == 0 for i in range(len(self.indices))]
+            for json_catalog in (saved_catalog, Catalog.from_dataframe(self.df)):
+                products = json.loads(json_catalog.get_json(self.indices, is_wishlisted=is_wishlisted))
+                self.assertEqual([product.pop('is_wishlisted') for product in products], is_wishlisted)
+                assert_rows_equal(self, products, expected_rows)
+            del saved_catalog
+
+    def test_get_rows_empty(self):
+        self.assertEqual(Catalog.from_dataframe(self.df).get_rows([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+import click_log
+from click_log import SegmentLog
+
+
+class TestSegmentLog(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = self.tempdir.name
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_rotates_and_reads_back(self):
+        log = SegmentLog(self.directory, max_bytes=100)
+        rows = [{'user_id' : i, 'product_index' : 10 * i, 'clicked_at' : datetime(2024, 1, 1, 12, i)} for i in range(5)]
+        for row in rows:
+            log.write([row])
+        self.assertGreater(len(click_log.closed_segments(self.directory)), 0)
+        log.close()
+
+        read_rows = [row for path in click_log.closed_segments(self.directory) for row in click_log.read_segment(path)]
+        self.assertEqual(sorted(row['user_id'] for row in read_rows), list(range(5)))
+        self.assertEqual(read_rows[0]['clicked_at'], '2024-01-01T12:00:00')
+        self.assertEqual(os.listdir(self.directory), [name for name in os.listdir(self.directory) if name.endswith('.jsonl')])
+
+    def test_open_segments_are_loaded_only_when_stale_and_writer_is_dead(self):
+        log = SegmentLog(self.directory)
+        log.write([{'user_id' : 1}])
+        self.assertEqual(click_log.closed_segments(self.directory), [])
+        # Written by this (live) process.
+        self.assertEqual(click_log.closed_segments(self.directory, stale_seconds=-1), [])
+
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        path = os.path.join(self.directory, f'user_click-{socket.gethostname()}-{dead.pid}-20240101T000000000000.jsonl.open')
+        with open(path, 'wb') as f:
+            f.write(b'{"user_id":2}\n')
+        self.assertEqual(click_log.closed_segments(self.directory), [])
+        self.assertEqual(click_log.closed_segments(self.directory, stale_seconds=-1), [path])
+        log.close()
+
+    def test_write_survives_segment_moved_while_open(self):
+        log = SegmentLog(self.directory, max_bytes=30)
+        log.write([{'user_id' : 1}])
+        # Taken by the loader before the writer rotates it.
+        (open_path,) = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        os.rename(open_path, os.path.join(self.directory, 'taken'))
+        log.write([{'user_id' : 2, 'product_index' : 1234567}])
+        for i in range(3):
+            log.write([{'user_id' : 3 + i}])
+        log.close()
+        rows = [row for path in click_log.closed_segments(self.directory) for row in click_log.read_segment(path)]
+        self.assertEqual([row['user_id'] for row in rows], [3, 4, 5])
+
+    def test_close_expired(self):
+        log = SegmentLog(self.directory, max_seconds=60)
+        log.write([{'user_id' : 1}])
+        log.close_expired()
+        self.assertEqual(click_log.closed_segments(self.directory), [])
+        log.max_seconds = 0
+        log.close_expired()
+        self.assertEqual(len(click_log.closed_segments(self.directory)), 1)
+        self.assertFalse([name for name in os.listdir(self.directory) if name.endswith('.open')])
+
+    def test_skips_partial_last_line(self):
+        path = os.path.join(self.directory, 'user_click-host-1-0.jsonl')
+        with open(path, 'wb') as f:
+            f.write(b'{"user_id":1}\n{"user_id":')
+        self.assertEqual(list(click_log.read_segment(path)), [{'user_id' : 1}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import gzip
+import os
+import tempfile
+import unittest
+from clip_tokenizer import ClipTokenizer, bytes_to_unicode
+
+
+class TestClipTokenizer(unittest.TestCase):
+    def setUp(self):
+        # A header line and two merges : 'r e' and 're d</w>'.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'bpe.txt.gz')
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            f.write('#version: 0.2\nr e\nre d</w>\n')
+        self.tokenizer = ClipTokenizer(self.path, context_length=8)
+        self.num_bytes = len(bytes_to_unicode())
+
+    def test_merges_and_special_tokens(self):
+        tokens = self.tokenizer(['Red', 'RED  dress'])
+        self.assertEqual(tokens.shape, (2, 8))
+        sot, eot, red = self.tokenizer.sot_token_id, self.tokenizer.eot_token_id, self.tokenizer.encoder['red</w>']
+        self.assertEqual(red, 2 * self.num_bytes + 1)
+        self.assertEqual(tokens[0].tolist(), [sot, red, eot, 0, 0, 0, 0, 0])
+        # 'dress' has no merges, it's one token per character.
+        self.assertEqual(tokens[1, :3].tolist(), [sot, red, self.tokenizer.encoder['d']])
+
+    def test_truncates_with_end_of_text(self):
+        tokens = self.tokenizer('abcdefghijkl')[0]
+        self.assertEqual(len(tokens), 8)
+        self.assertEqual(tokens[-1], self.tokenizer.eot_token_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
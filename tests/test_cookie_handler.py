@@ -0,0 +1,45 @@
+import unittest
+from unittest import mock
+from flask import Flask, g
+from config import Config
+
+Config.SECRET_KEY = Config.SECRET_KEY or 'test-secret-key'
+import cookie_handler
+from caches import StatsCache
+
+
+class TestGetAuthInfo(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        patch = mock.patch.object(cookie_handler, 'verified_cookies', StatsCache(maxsize=10, ttl=60))
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.auth_cookie = cookie_handler.serializer.dumps({'user_id' : 7, 'session_id' : 'abc'})
+
+    def get_auth_info(self, cookie=None, is_bot=False):
+        headers = {'Cookie' : f'auth_info={cookie}'} if cookie else {}
+        with self.app.test_request_context('/', headers=headers):
+            g.is_bot = is_bot
+            cookie_handler.get_auth_info()
+            return g.user_id, g.session_id, dict(g.cookie_updates)
+
+    def test_caches_verified_cookies(self):
+        for _ in range(3):
+            self.assertEqual(self.get_auth_info(self.auth_cookie)[:2], (7, 'abc'))
+        stats = cookie_handler.verified_cookies.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_tampered_cookies_are_not_cached(self):
+        for _ in range(2):
+            self.assertEqual(self.get_auth_info(self.auth_cookie[:-2] + 'xx'), (None, None, {}))
+        self.assertEqual(len(cookie_handler.verified_cookies), 0)
+
+    def test_sessions_are_issued_to_browsers_only(self):
+        _, session_id, cookie_updates = self.get_auth_info()
+        self.assertIsNotNone(session_id)
+        self.assertEqual(cookie_handler.serializer.loads(cookie_updates['auth_info']), {'session_id' : session_id})
+        self.assertEqual(self.get_auth_info(is_bot=True), (None, None, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
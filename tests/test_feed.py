@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+from feed import TasteVectors, sample_feed, sample_taste_feed, taste_vector
+
+
+class FakeIndex:
+    def __init__(self, embeddings):
+        self.embeddings, self.ntotal = embeddings, len(embeddings)
+
+    def search(self, queries, k):
+        scores = queries @ self.embeddings.T
+        indices = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, indices, axis=1), indices
+
+
+class TestSampleFeed(unittest.TestCase):
+    def setUp(self):
+        self.similar_products_cache = np.arange(100, dtype=np.int32).reshape(10, 10)
+
+    def test_samples_distinct_neighbors_excluding_wishlisted(self):
+        rng = np.random.default_rng(0)
+        sampled = sample_feed([0, 1, 1], self.similar_products_cache, num_products=100, exclude=[3, 15], rng=rng)
+        self.assertEqual(sorted(sampled.tolist()), [i for i in range(20) if i not in (3, 15)])
+
+    def test_limits_and_ignores_invalid_clicks(self):
+        rng = np.random.default_rng(0)
+        sampled = sample_feed([2, 42, -1], self.similar_products_cache, num_products=4, rng=rng)
+        self.assertEqual(len(sampled), 4)
+        self.assertTrue(set(sampled.tolist()) <= set(range(20, 30)))
+        self.assertEqual(len(sample_feed([42], self.similar_products_cache, num_products=4)), 0)
+
+    def test_prefers_recent_clicks_and_top_neighbors(self):
+        rng = np.random.default_rng(0)
+        counts = np.zeros(100)
+        for _ in range(500):
+            counts[sample_feed([0, 9], self.similar_products_cache, num_products=5, recency_decay=0.2, rng=rng)] += 1
+        self.assertGreater(counts[:10].sum(), counts[90:].sum())
+        self.assertGreater(counts[0], counts[9])
+
+
+class TestTasteVectors(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.normal(size=(20, 8)).astype(np.float32)
+        self.embeddings /= np.linalg.norm(self.embeddings, axis=-1, keepdims=True)
+
+    def test_incremental_updates_match_recomputing(self):
+        taste_vectors = TasteVectors(max_users=10, ttl=60, recency_decay=0.5)
+        self.assertIsNone(taste_vectors.get(1, self.embeddings))
+        taste_vectors.seed(1, taste_vector([3, 2, 1], self.embeddings, recency_decay=0.5))
+        taste_vectors.add(1, 7)
+        taste_vectors.add(1, 9)
+        np.testing.assert_allclose(taste_vectors.get(1, self.embeddings),
+                                   taste_vector([9, 7, 3, 2, 1], self.embeddings, recency_decay=0.5), rtol=1e-5)
+
+    def test_taste_feed_searches_around_clicks_and_skips_excluded(self):
+        rng = np.random.default_rng(0)
+        index = FakeIndex(self.embeddings)
+        click_vector = taste_vector([4], self.embeddings)
+        sampled = sample_taste_feed(click_vector, np.zeros((0, 8)), index, num_products=3, exclude={4}, num_candidates=3, rng=rng)
+        nearest = index.search(self.embeddings[4:5], 4)[1][0].tolist()
+        self.assertEqual(sorted(sampled.tolist()), sorted(nearest[1:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
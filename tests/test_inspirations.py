@@ -0,0 +1,45 @@
+import unittest
+import json
+import numpy as np
+from inspirations import Inspirations
+
+
+def make_inspirations_obj():
+    return {
+        'WOMAN' : [{'category' : f'category {i}', 'products' : [{'index' : 10 * i + j, 'name' : f'p{j}'} for j in range(5)]}
+                   for i in range(4)] + [{'category' : 'repeat', 'products' : [{'index' : 0, 'name' : 'p0'}]}],
+        'MAN' : [],
+    }
+
+
+def canonical(inspirations):
+    return sorted((insp['category'], sorted(product['index'] for product in insp['products'])) for insp in inspirations)
+
+
+class TestInspirations(unittest.TestCase):
+    def setUp(self):
+        self.inspirations_obj = make_inspirations_obj()
+        self.inspirations = Inspirations(self.inspirations_obj)
+
+    def test_shuffled_does_not_mutate_shared_state(self):
+        rng = np.random.default_rng(0)
+        before = json.dumps(self.inspirations.inspirations['WOMAN'])
+        shuffled = self.inspirations.shuffled('WOMAN', rng=rng)
+        shuffled[0]['products'].clear()
+        self.assertEqual(json.dumps(self.inspirations.inspirations['WOMAN']), before)
+        self.assertEqual(canonical(self.inspirations.shuffled('WOMAN', rng=rng)), canonical(self.inspirations_obj['WOMAN']))
+
+    def test_shuffled_json_matches_shuffled(self):
+        shuffled_json = json.loads(self.inspirations.shuffled_json('WOMAN', rng=np.random.default_rng(1)))
+        self.assertEqual(shuffled_json, self.inspirations.shuffled('WOMAN', rng=np.random.default_rng(1)))
+        self.assertEqual(json.loads(self.inspirations.shuffled_json('MAN')), [])
+
+    def test_sample_products_are_distinct(self):
+        sampled = self.inspirations.sample_products('WOMAN', 100, rng=np.random.default_rng(0))
+        self.assertEqual(sorted(sampled.tolist()), sorted({10 * i + j for i in range(4) for j in range(5)}))
+        self.assertEqual(len(self.inspirations.sample_products('WOMAN', 3)), 3)
+        self.assertEqual(len(self.inspirations.sample_products('MAN', 3)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
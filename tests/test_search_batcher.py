@@ -0,0 +1,63 @@
+import unittest
+import threading
+import time
+import numpy as np
+from search_batcher import SearchBatcher
+
+
+class FakeQueryEncoder:
+    """Embeds a query as a one-hot vector on len(query), and records the batch sizes it's called with."""
+    def __init__(self, dim=64, delay=0.0):
+        self.dim, self.delay = dim, delay
+        self.batch_sizes = []
+
+    def encode_many(self, queries):
+        self.batch_sizes.append(len(queries))
+        time.sleep(self.delay)
+        embeddings = np.zeros((len(queries), self.dim), dtype=np.float32)
+        embeddings[np.arange(len(queries)), [len(query) for query in queries]] = 1
+        return embeddings
+
+
+class FakeIndex:
+    def search(self, embeddings, k):
+        # Top result is the one-hot position, followed by the next k - 1 ids.
+        first = embeddings.argmax(axis=1)
+        indices = first[:, None] + np.arange(k)[None, :]
+        return np.zeros_like(indices, dtype=np.float32), indices
+
+
+class SearchBatcherTestCase(unittest.TestCase):
+
+    def test_idle_search_runs_inline(self):
+        encoder = FakeQueryEncoder()
+        batcher = SearchBatcher(lambda: encoder, get_index=FakeIndex)
+        np.testing.assert_array_equal(batcher.search('abc', 3), [3, 4, 5])
+        self.assertEqual(encoder.batch_sizes, [1])
+        self.assertIsNone(batcher._thread)
+
+    def test_concurrent_searches_are_batched(self):
+        encoder = FakeQueryEncoder(delay=0.05)
+        batcher = SearchBatcher(lambda: encoder, get_index=FakeIndex, max_batch_size=16, max_wait_ms=20)
+        queries = ['x' * length for length in range(1, 13)]
+        results = {}
+
+        def search(query):
+            results[query] = batcher.search(query, len(query) % 3 + 1)
+
+        threads = [threading.Thread(target=search, args=(query,)) for query in queries]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for query in queries:
+            k = len(query) % 3 + 1
+            np.testing.assert_array_equal(results[query], np.arange(len(query), len(query) + k))
+        self.assertEqual(sum(encoder.batch_sizes), len(queries))
+        self.assertLess(len(encoder.batch_sizes), len(queries))
+        self.assertEqual(sum(batcher.stats()['batch_size'].values()), len(encoder.batch_sizes))
+
+
+if __name__ == '__main__':
+    unittest.main()
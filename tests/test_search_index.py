@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import faiss
+import search_index
+from config import Config
+
+get_factory_string = search_index.get_factory_string
+
+
+class TestReadIndex(unittest.TestCase):
+    def setUp(self):
+        embeddings = np.random.default_rng(0).standard_normal((2000, search_index.DIM)).astype(np.float32)
+        self.embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for patch in (mock.patch.object(Config, 'FAISS_NLIST', 4), mock.patch.object(Config, 'FAISS_PQ_M', 8),
+                      # 4-bit PQ codes train much faster than 8-bit ones, the index (and its reader) is the same IndexIVFPQ.
+                      mock.patch.object(search_index, 'get_factory_string', lambda index_type : get_factory_string(index_type).replace('x8', 'x4'))):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_reads_back_every_index_type(self):
+        for index_type in search_index.INDEX_TYPES:
+            path = os.path.join(self.directory.name, f'{index_type}.index')
+            index = search_index.build_index(self.embeddings, index_type)
+            faiss.write_index(index, path)
+            expected = index.search(self.embeddings[:4], 8)[1]
+            # With and without the index type (which falls back to the other mmap flag).
+            for kwargs in ({'index_type' : index_type}, {}, {'mmap' : False}):
+                with self.subTest(index=index_type, kwargs=kwargs):
+                    loaded = search_index.read_index(path, **kwargs)
+                    self.assertEqual(loaded.ntotal, len(self.embeddings))
+                    np.testing.assert_array_equal(loaded.search(self.embeddings[:4], 8)[1], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import copy
+import threading
+import time
+import unittest
+from user_state import LocalBackend, RedisBackend, UserStateCache
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class Loader:
+    def __init__(self, value):
+        self.value, self.calls = value, 0
+
+    def __call__(self):
+        self.calls += 1
+        return copy.copy(self.value)
+
+
+class UserStateCacheTests:
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.cache = UserStateCache(self.make_backend(), max_clicks=3)
+
+    def test_reads_through_once(self):
+        load = Loader([3, 2])
+        self.assertEqual(self.cache.get_wishlist(1, load), [3, 2])
+        self.assertEqual(self.cache.get_wishlist(1, load), [3, 2])
+        self.assertEqual(load.calls, 1)
+        # Users and fields are independent.
+        self.assertEqual(self.cache.get_wishlist(2, Loader([7])), [7])
+        self.assertEqual(self.cache.get_recent_clicks(1, Loader([9])), [9])
+
+    def test_writes_through_toggles(self):
+        self.cache.get_wishlist(1, Loader([3, 2]))
+        self.cache.set_wishlisted(1, 5, True)
+        self.cache.set_wishlisted(1, 3, False)
+        load = Loader([])
+        self.assertEqual(self.cache.get_wishlist(1, load), [5, 2])
+        self.assertEqual(load.calls, 0)
+
+    def test_recent_clicks_are_distinct_and_capped(self):
+        self.cache.get_recent_clicks(1, Loader([3, 2, 1]))
+        self.cache.record_click(1, 2)
+        self.cache.record_click(1, 9)
+        self.assertEqual(self.cache.get_recent_clicks(1, Loader([])), [9, 2, 3])
+
+    def test_invalidated_user_is_reloaded(self):
+        self.cache.get_user(1, Loader({'id' : 1, 'gender' : None}))
+        self.cache.invalidate_user(1)
+        load = Loader({'id' : 1, 'gender' : 'MAN'})
+        self.assertEqual(self.cache.get_user(1, load), {'id' : 1, 'gender' : 'MAN'})
+        self.assertEqual(self.cache.get_user(1, load), {'id' : 1, 'gender' : 'MAN'})
+        self.assertEqual(load.calls, 1)
+
+    def test_set_user_replaces_cached_snapshot(self):
+        self.cache.get_user(1, Loader({'id' : 1, 'name' : 'old'}))
+        self.cache.set_user(1, {'id' : 1, 'name' : 'new'})
+        load = Loader({'id' : 1, 'name' : 'sql'})
+        self.assertEqual(self.cache.get_user(1, load), {'id' : 1, 'name' : 'new'})
+        # Also without a cached snapshot.
+        self.cache.set_user(2, {'id' : 2})
+        self.assertEqual(self.cache.get_user(2, load), {'id' : 2})
+        self.assertEqual(load.calls, 0)
+
+    def test_concurrent_updates_are_not_lost(self):
+        # Both writers read the value before either writes it back, the second one must not drop the first's update.
+        self.cache.get_wishlist(1, Loader([1]))
+        def add(product_index):
+            def update(wishlist):
+                time.sleep(0.05)
+                return [product_index] + wishlist
+            self.cache._update(1, 'wishlist', update)
+        threads = [threading.Thread(target=add, args=(product_index,)) for product_index in (5, 7)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(self.cache.get_wishlist(1, Loader([]))), [1, 5, 7])
+
+    def test_update_without_cached_value_invalidates(self):
+        # A toggle while no value is cached (e.g. a concurrent request is loading it) must not leave a stale value.
+        version = self.cache._version(1, 'wishlist')
+        self.cache.set_wishlisted(1, 5, True)
+        self.cache.backend.set(self.cache._key(1, 'wishlist', version), b'[1]')
+        load = Loader([5])
+        self.assertEqual(self.cache.get_wishlist(1, load), [5])
+        self.assertEqual(load.calls, 1)
+
+
+class TestLocalBackend(UserStateCacheTests, unittest.TestCase):
+    def make_backend(self):
+        return LocalBackend(max_keys=100, ttl=60)
+
+    def test_without_backend_always_loads(self):
+        cache, load = UserStateCache(None, max_clicks=3), Loader([1])
+        cache.get_wishlist(1, load)
+        cache.set_wishlisted(1, 2, True)
+        self.assertEqual(cache.get_wishlist(1, load), [1])
+        self.assertEqual(load.calls, 2)
+
+    def test_without_backend_caches_worker_fields(self):
+        cache = UserStateCache(None, max_clicks=3, worker_backend=self.make_backend())
+        wishlist, clicks = Loader([1]), Loader([3, 2])
+        cache.get_wishlist(1, wishlist)
+        cache.get_wishlist(1, wishlist)
+        cache.get_recent_clicks(1, clicks)
+        cache.record_click(1, 9)
+        self.assertEqual(cache.get_recent_clicks(1, clicks), [9, 3, 2])
+        self.assertEqual((wishlist.calls, clicks.calls), (2, 1))
+        user = Loader({'id' : 1})
+        cache.get_user(1, user)
+        cache.get_user(1, user)
+        cache.invalidate_user(1)
+        cache.get_user(1, user)
+        self.assertEqual(user.calls, 2)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestRedisBackend(UserStateCacheTests, unittest.TestCase):
+    def make_backend(self):
+        return RedisBackend(fakeredis.FakeRedis(), ttl=60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import numpy as np
+from config import Config
+
+OPEN_CLIP, TORCHSCRIPT, ONNX = 'OPEN_CLIP', 'TORCHSCRIPT', 'ONNX'
+RUNTIMES = (OPEN_CLIP, TORCHSCRIPT, ONNX)
+
+
+def get_text_encoder_path(runtime, quantized=False):
+    """Location of the exported text tower written by scripts/export_text_encoder.py."""
+    extension = {TORCHSCRIPT : 'pt', ONNX : 'onnx'}[runtime]
+    suffix = '_int8' if quantized else ''
+    return os.path.join(Config.DATA_ROOT_DIR, f'text_encoder{suffix}.{extension}')
+
+def get_tokenizer_path():
+    """BPE merges of the CLIP tokenizer, copied from open_clip next to the exported text tower."""
+    return os.path.join(Config.DATA_ROOT_DIR, 'text_encoder_bpe_vocab.txt.gz')
+
+
+class OpenClipTextEncoder:
+    """The reference open_clip text tower."""
+    def __init__(self, model):
+        import torch
+        self.model, self.torch = model, torch
+
+    def encode_text(self, tokens):
+        # Grad mode is thread local, and encoding also runs on loader / batcher / request threads.
+        with self.torch.no_grad():
+            return self.model.encode_text(tokens).detach().numpy()
+
+
+class TorchScriptTextEncoder:
+    def __init__(self, path):
+        import torch
+        self.module, self.torch = torch.jit.load(path, map_location='cpu').eval(), torch
+
+    def encode_text(self, tokens):
+        with self.torch.no_grad():
+            return self.module(self.torch.as_tensor(tokens)).detach().numpy()
+
+
+class OnnxTextEncoder:
+    def __init__(self, path):
+        # Optional dependency, only needed when TEXT_ENCODER_RUNTIME=ONNX.
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def encode_text(self, tokens):
+        tokens = np.asarray(tokens, dtype=np.int64)
+        return self.session.run(['embeddings'], {'tokens' : tokens})[0]
+
+
+def load_exported_text_encoder(runtime, quantized=False, path=None):
+    path = path or get_text_encoder_path(runtime, quantized=quantized)
+    if runtime == TORCHSCRIPT:
+        return TorchScriptTextEncoder(path)
+    if runtime == ONNX:
+        return OnnxTextEncoder(path)
+    raise ValueError(f"{runtime=} is not an exported runtime, expected one of {(TORCHSCRIPT, ONNX)}")
@@ -0,0 +1,204 @@
+import json
+import random
+import threading
+import cachetools
+from config import Config
+
+WISHLIST, RECENT_CLICKS, USER = 'wishlist', 'recent_clicks', 'user'
+# Without a shared backend, these fields are still cached per worker (worker_backend). A worker then only sees other
+# workers' writes once its entry expires, which is fine for the feed and the profile (whose fields don't change after
+# sign up), but not for wishlists : toggles must show up on the next request, whichever worker serves it.
+WORKER_FIELDS = (RECENT_CLICKS, USER)
+
+
+class LocalBackend:
+    """In-process key value store with a TTL, for tests and single node deployments. Stores bytes, like Redis."""
+    def __init__(self, max_keys, ttl):
+        self._data = cachetools.TTLCache(maxsize=max_keys, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key, value, nx=False):
+        """With nx, only sets the key if it doesn't exist. Returns whether it was set."""
+        with self._lock:
+            if nx and key in self._data:
+                return False
+            self._data[key] = value
+            return True
+
+    def incr(self, key):
+        with self._lock:
+            return self._incr(key)
+
+    def update(self, version_key, value_key, update, replace=False):
+        """Atomically : bumps the version, and stores update(value) under the new version if there was a value under
+        the old one (or always with replace, update(None) then). update is None (or returns None) to only bump the
+        version. Does nothing without a version."""
+        with self._lock:
+            version = self._data.get(version_key)
+            if version is None:
+                return
+            value = self._data.get(value_key(int(version)))
+            version = self._incr(version_key)
+            value = update(value) if ((value is not None or replace) and update is not None) else None
+            if value is not None:
+                self._data[value_key(version)] = value
+
+    def _incr(self, key):
+        value = int(self._data.get(key, 0)) + 1
+        self._data[key] = str(value).encode()
+        return value
+
+
+class RedisBackend:
+    """Redis (or any Redis protocol server) shared by all workers and nodes. Keys expire after ttl seconds."""
+    def __init__(self, client, ttl):
+        self.client, self.ttl = client, ttl
+
+    @classmethod
+    def from_url(cls, url, ttl):
+        # Optional dependency, only needed when USER_STATE_BACKEND=REDIS.
+        import redis
+        return cls(redis.Redis.from_url(url, socket_timeout=0.1), ttl)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, nx=False):
+        return bool(self.client.set(key, value, ex=self.ttl, nx=nx))
+
+    def incr(self, key):
+        pipeline = self.client.pipeline()
+        pipeline.incr(key)
+        pipeline.expire(key, self.ttl)
+        return pipeline.execute()[0]
+
+    def update(self, version_key, value_key, update, replace=False):
+        """Same as LocalBackend.update, as a WATCH / MULTI transaction on the version key. Redis retries it if another
+        writer bumps the version in between."""
+        def transaction(pipeline):
+            version = pipeline.get(version_key)
+            if version is None:
+                return
+            value = pipeline.get(value_key(int(version)))
+            value = update(value) if ((value is not None or replace) and update is not None) else None
+            pipeline.multi()
+            pipeline.incr(version_key)
+            pipeline.expire(version_key, self.ttl)
+            if value is not None:
+                pipeline.set(value_key(int(version) + 1), value, ex=self.ttl)
+        self.client.transaction(transaction, version_key)
+
+
+class UserStateCache:
+    """Per-user wishlists, recent clicks and user snapshots, read through from SQL and written through on toggles / clicks.
+
+    Every (user, field) has a version, and values are stored under keys including it. Writes bump the version, so a
+    request that loaded the value from SQL before a concurrent write stores it under a key nobody reads anymore.
+    Versions start at a random value, so a version key that expired or got evicted can't resurrect old values.
+    Backend errors are logged and treated as misses, SQL stays the source of truth. Without a backend, WORKER_FIELDS
+    use worker_backend (if given) and other reads go to SQL.
+    """
+    def __init__(self, backend, max_clicks, namespace='user_state:v1', worker_backend=None):
+        self.backend, self.max_clicks, self.namespace = backend, max_clicks, namespace
+        self.worker_backend = worker_backend
+
+    def get_wishlist(self, user_id, load):
+        """Wishlisted product indexes, most recently added first. load() reads them from SQL on a miss."""
+        return self._get_or_load(user_id, WISHLIST, load)
+
+    def set_wishlisted(self, user_id, product_index, wishlisted):
+        def update(wishlist):
+            wishlist = [index for index in wishlist if index != product_index]
+            return [product_index] + wishlist if wishlisted else wishlist
+        self._update(user_id, WISHLIST, update)
+
+    def get_recent_clicks(self, user_id, load):
+        """Distinct clicked product indexes, most recent first. load() reads them from SQL on a miss."""
+        return self._get_or_load(user_id, RECENT_CLICKS, load)
+
+    def record_click(self, user_id, product_index):
+        self._update(user_id, RECENT_CLICKS,
+                     lambda clicks: ([product_index] + [index for index in clicks if index != product_index])[:self.max_clicks])
+
+    def get_user(self, user_id, load):
+        """Snapshot (dict of User columns) of the user. load() reads it from SQL on a miss."""
+        return self._get_or_load(user_id, USER, load)
+
+    def invalidate_user(self, user_id):
+        """Called after the user row changes (onboarding, account deletion), the next get_user reloads it."""
+        self._update(user_id, USER, None)
+
+    def set_user(self, user_id, snapshot):
+        """Replaces the cached snapshot with one just read or written (e.g. at login), whether or not one is cached."""
+        self._update(user_id, USER, lambda _: snapshot, replace=True)
+
+    def _key(self, user_id, field, version=None):
+        key = f'{self.namespace}:{user_id}:{field}'
+        return key if version is None else f'{key}:{version}'
+
+    def _backend(self, field):
+        if self.backend is not None:
+            return self.backend
+        return self.worker_backend if field in WORKER_FIELDS else None
+
+    def _version(self, user_id, field):
+        backend, version_key = self._backend(field), self._key(user_id, field, 'version')
+        version = backend.get(version_key)
+        if version is None:
+            backend.set(version_key, str(random.getrandbits(48)).encode(), nx=True)
+            version = backend.get(version_key)
+        return int(version)
+
+    def _get_or_load(self, user_id, field, load):
+        backend = self._backend(field)
+        if backend is None:
+            return load()
+        try:
+            key = self._key(user_id, field, self._version(user_id, field))
+            value = backend.get(key)
+            if value is not None:
+                return json.loads(value)
+        except Exception as e:
+            print(f"ERROR: Reading user state failed, {user_id=}, {field=}, {e=}")
+            return load()
+        value = load()
+        try:
+            backend.set(key, json.dumps(value).encode())
+        except Exception as e:
+            print(f"ERROR: Writing user state failed, {user_id=}, {field=}, {e=}")
+        return value
+
+    def _update(self, user_id, field, update, replace=False):
+        """Applies update to the cached value if there's one, under a new version. Otherwise (or without update) just
+        bumps the version. With replace, stores update(None) even without a cached value. Atomic in the backend, so
+        concurrent writers can't overwrite each other's updates."""
+        backend = self._backend(field)
+        if backend is None:
+            return
+        encoded_update = (lambda value: json.dumps(update(json.loads(value) if value is not None else None)).encode()) \
+            if update else None
+        try:
+            if replace:
+                # Creates the version if there's none yet.
+                self._version(user_id, field)
+            backend.update(self._key(user_id, field, 'version'), lambda version: self._key(user_id, field, version),
+                                encoded_update, replace=replace)
+        except Exception as e:
+            print(f"ERROR: Updating user state failed, {user_id=}, {field=}, {e=}")
+
+
+def create_backend():
+    if Config.USER_STATE_BACKEND == 'REDIS':
+        return RedisBackend.from_url(Config.USER_STATE_REDIS_URL, ttl=Config.USER_STATE_TTL)
+    if Config.USER_STATE_BACKEND == 'LOCAL':
+        return LocalBackend(max_keys=Config.USER_STATE_MAX_KEYS, ttl=Config.USER_STATE_TTL)
+    return None
+
+
+user_state_cache = UserStateCache(create_backend(), max_clicks=Config.FEED_CLICK_SAMPLE,
+                                  worker_backend=LocalBackend(max_keys=Config.USER_STATE_WORKER_MAX_KEYS,
+                                                              ttl=Config.USER_STATE_WORKER_TTL))